@@ -1,72 +1,197 @@
-import requests
-import time
+import os
+import asyncio
+import re
+import http_client
+import deadlines
+import calculator
 
-def get_response_time(url: str) -> str:
-    if not url.startswith('http'):
-        url = 'https://' + url
+async def get_response_time(url: str, samples: int = None, method: str = "GET", mode: str = "cold") -> str:
+    """
+    Measure how long a website takes to respond: median, min and p95 over several
+    samples, with DNS / connect / TLS / time-to-first-byte / transfer breakdown.
+    url: website address, e.g. "example.com"; separate several with commas to probe them at once.
+    samples: requests per site (default 3).
+    method: "GET" (default) or "HEAD".
+    mode: "cold" (default) opens a new connection per sample like a first visit; "warm" reuses one.
+    """
+    # Deliberately not the shared pool: probe.py manages its own connections.
+    # Single-tool backends are imported on first use; server.py warms them up at start.
+    import probe
+    urls = [part for part in re.split(r"[,\s]+", url) if part]
     try:
-        start_time = time.time()
-        response = requests.get(url, timeout=10)
-        end_time = time.time()
-        duration = end_time - start_time
-        return f"{duration:.2f} seconds"
-    except Exception as e:
-        return f"Error: {str(e)}"
+        # Text-mode tool calls may pass numbers as strings
+        lines = await probe.probe(urls, int(samples) if samples else None, method or "GET", mode or "cold")
+    except ValueError as e:
+        return f"Error: {e}"
+    if len(lines) == 1:
+        return lines[0]
+    return "\n".join(f"{target}: {line}" for target, line in zip(urls, lines))
 
 def calculate(expression: str) -> str:
+    """
+    Evaluate a mathematical expression: + - * / // % ** (or ^), sqrt, log, exp,
+    sin/cos/tan, factorial, comb, gcd, round, min/max, mean, pi, e and more.
+    expression: arithmetic expression, e.g. "2 * 3.5 + 10"; separate several with ";".
+    """
+    # Restricted AST evaluator with cost caps, no eval() (see calculator.py)
+    expressions = calculator.split_expressions(expression)
     try:
-        # Safety: limiting the scope of eval to math
-        allowed_names = {
-            "abs": abs, "round": round, "min": min, "max": max, "pow": pow,
-            "int": int, "float": float
-        }
-        # A very basic safety check - in production use a safer parser
-        code = compile(expression, "<string>", "eval")
-        for names in code.co_names:
-            if names not in allowed_names:
-                raise NameError(f"Use of {names} is not allowed")
-        return str(eval(code, {"__builtins__": {}}, allowed_names))
-    except Exception as e:
-        return f"Error evaluating expression: {str(e)}"
+        if len(expressions) <= 1:
+            # "2+2;" is one expression with a stray separator
+            return str(calculator.evaluate(expressions[0] if expressions else ""))
+        results = calculator.evaluate_many(expressions)
+    except calculator.CalculationError as e:
+        return f"Error evaluating expression: {e}"
+    return "\n".join(
+        f"{expr} = Error: {result}" if isinstance(result, Exception) else f"{expr} = {result}"
+        for expr, result in zip(expressions, results)
+    )
+
+WIKI_API = "https://en.wikipedia.org/w/api.php"
+
+# web_search tuning: how many summaries to return, how long each is,
+# how many top-ranked pages to fetch in parallel, and the per-call deadline
+SEARCH_RESULTS = int(os.getenv("SEARCH_RESULTS", "3"))
+SEARCH_SENTENCES = int(os.getenv("SEARCH_SENTENCES", "2"))
+SEARCH_CANDIDATES = int(os.getenv("SEARCH_CANDIDATES", "6"))
+SEARCH_MAX_RESULTS = 10    # The title search returns at most 10 pages
+SEARCH_MAX_SENTENCES = 10
+SEARCH_DEADLINE = float(os.getenv("SEARCH_DEADLINE", "8"))
+# "wikipedia" queries the live API; "local" uses the offline index built by wiki_index.py
+SEARCH_BACKEND = os.getenv("SEARCH_BACKEND", "wikipedia")
+
+async def _wiki_search(query: str, limit: int = 10) -> list:
+    response = await http_client.get(WIKI_API, params={
+        "action": "query", "list": "search", "srsearch": query,
+        "srlimit": limit, "srprop": "", "format": "json"
+    })
+    response.raise_for_status()
+    data = response.json()
+    if "error" in data:
+        raise Exception(data["error"].get("info", "search failed"))
+    return [item["title"] for item in data["query"]["search"]]
+
+async def _wiki_summary(title: str, sentences: int = 2) -> str:
+    # Same query the wikipedia package uses for summary(), plus pageprops
+    # so disambiguation pages can be skipped without a second request
+    response = await http_client.get(WIKI_API, params={
+        "action": "query", "prop": "extracts|pageprops", "ppprop": "disambiguation",
+        "explaintext": "", "exintro": "", "exsentences": sentences,
+        "titles": title, "redirects": "", "format": "json"
+    })
+    response.raise_for_status()
+    pages = response.json().get("query", {}).get("pages", {})
+    page = next(iter(pages.values()), {})
+    if "missing" in page or "disambiguation" in page.get("pageprops", {}):
+        raise LookupError(f"No readable page for '{title}'")
+    summary = page.get("extract", "").strip()
+    if not summary:
+        raise LookupError(f"Empty summary for '{title}'")
+    return summary
+
+async def _first_in_rank_order(tasks: list, wanted: int, timeout: float) -> list:
+    """
+    Wait until the first `wanted` successful tasks in list order are known (or the
+    deadline passes), then cancel whatever is still running. Returns the results
+    of the successful tasks, in order.
+    """
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + timeout
+    pending = set(tasks)
+    try:
+        while pending:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            _, pending = await asyncio.wait(pending, timeout=remaining,
+                                            return_when=asyncio.FIRST_COMPLETED)
+            # Done once every task ahead of the wanted-th success has finished
+            successes = 0
+            for task in tasks:
+                if not task.done():
+                    break
+                if not task.exception():
+                    successes += 1
+                    if successes >= wanted:
+                        break
+            if successes >= wanted:
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+        # Collect every outcome, including lower-ranked fetches that failed before
+        # they could be cancelled, so none is left as "exception never retrieved"
+        await asyncio.gather(*tasks, return_exceptions=True)
 
-import wikipedia
+    results = []
+    for task in tasks:
+        if task.done() and not task.cancelled() and not task.exception():
+            results.append(task.result())
+            if len(results) >= wanted:
+                break
+    return results
 
-def web_search(query: str) -> str:
+async def web_search(query: str, max_results: int = None, sentences: int = None) -> str:
+    """
+    Search Wikipedia and return short summaries of the top matching pages.
+    Use only for current events, people's current status or obscure facts.
+    query: 2-3 precise keywords (e.g. "Google CEO"), not the full question.
+    max_results: number of summaries to return (default 3).
+    sentences: sentences per summary (default 2).
+    """
+    try:
+        # Text-mode tool calls may pass numbers as strings
+        max_results = min(max(int(max_results or SEARCH_RESULTS), 1), SEARCH_MAX_RESULTS)
+        sentences = min(max(int(sentences or SEARCH_SENTENCES), 1), SEARCH_MAX_SENTENCES)
+    except ValueError:
+        return "Error searching: max_results and sentences must be numbers"
+    if SEARCH_BACKEND == "local":
+        return await _local_search(query, max_results, sentences)
     try:
-        search_results = wikipedia.search(query)
+        search_results = await _wiki_search(query)
         if not search_results:
             return f"No results found for '{query}'."
-        
-        # Iterate through search results and try to get summaries until we have 3
-        combined_results = []
-        
-        for page_title in search_results:
-            if len(combined_results) >= 3:
-                break
-                
-            try:
-                # Use fewer sentences per result to keep context short
-                summary = wikipedia.summary(page_title, sentences=2, auto_suggest=False)
-                combined_results.append(f"Result ('{page_title}'):\n{summary}")
-            except Exception:
-                # PageError, DisambiguationError, etc. - skip and try next
-                continue
+
+        # Fetch summaries for the top candidates concurrently. Missing pages,
+        # disambiguations etc. just fail their task and the next-ranked page is used.
+        candidates = search_results[:max(SEARCH_CANDIDATES, max_results)]
+
+        async def fetch(page_title):
+            summary = await _wiki_summary(page_title, sentences=sentences)
+            return f"Result ('{page_title}'):\n{summary}"
+
+        tasks = [asyncio.create_task(fetch(title)) for title in candidates]
+        # Stop a little before the request deadline so partial results still make it back
+        combined_results = await _first_in_rank_order(tasks, max_results, deadlines.clamp(SEARCH_DEADLINE, reserve=0.5))
 
         if not combined_results:
              return f"No readable results found for '{query}'. Try a different keyword."
 
         return "\n\n".join(combined_results)
-    except wikipedia.exceptions.DisambiguationError as e:
-        return f"Search is ambiguous. Options: {e.options[:5]}"
     except Exception as e:
         return f"Error searching: {str(e)}"
 
-def get_weather(city: str) -> str:
+async def _local_search(query: str, max_results: int, sentences: int) -> str:
+    try:
+        # A few milliseconds of SQLite work, kept off the event loop
+        import wiki_index
+        results = await asyncio.to_thread(wiki_index.search, query, max_results, sentences)
+    except Exception as e:
+        return f"Error searching: {str(e)}"
+    if not results:
+        return f"No results found for '{query}'."
+    return "\n\n".join(f"Result ('{title}'):\n{summary}" for title, summary in results)
+
+async def get_weather(city: str) -> str:
+    """
+    Get the current weather conditions for a city.
+    city: city name, e.g. "London".
+    """
     try:
         # wttr.in format "%C %t": Condition + Temperature
         # e.g. "Partly cloudy +10°C"
-        url = f"https://wttr.in/{city}?format=%C+%t"
-        response = requests.get(url, timeout=10)
+        url = f"https://wttr.in/{city}"
+        response = await http_client.get(url, params={"format": "%C %t"})
         if response.status_code == 200:
             return f"Current weather in {city}: {response.text.strip()}"
         else:
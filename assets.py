@@ -0,0 +1,70 @@
+import os
+import gzip
+import hashlib
+import mimetypes
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Re-read a file when it changes on disk (handy while editing the UI);
+# serve.py turns this off so production workers never touch the disk per request
+STATIC_RELOAD = os.getenv("STATIC_RELOAD", "1") != "0"
+MIN_GZIP_SIZE = 1024  # Smaller bodies are not worth compressing
+
+
+class Asset:
+    """One static file held in memory, with its gzip variant and ETags."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mtime = os.stat(path).st_mtime
+        with open(path, "rb") as f:
+            self.body = f.read()
+        self.media_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        digest = hashlib.sha256(self.body).hexdigest()[:16]
+        self.etag = f'"{digest}"'
+        compressed = gzip.compress(self.body, compresslevel=9, mtime=0)
+        self.gzip_body = compressed if len(self.body) >= MIN_GZIP_SIZE and len(compressed) < len(self.body) else None
+        self.gzip_etag = f'"{digest}-gz"'
+
+
+class AssetCache:
+    """
+    Static files loaded once at start-up. Responses carry an ETag, so a browser
+    revalidating gets an empty 304, and a pre-compressed gzip body when the
+    client accepts it.
+    """
+
+    def __init__(self, directory: str, reload: bool = STATIC_RELOAD):
+        self.directory = directory
+        self.reload = reload
+        self.assets = {}
+        for root, _, files in os.walk(directory):
+            for name in files:
+                path = os.path.join(root, name)
+                self.assets[os.path.relpath(path, directory).replace(os.sep, "/")] = Asset(path)
+
+    def get(self, name: str):
+        asset = self.assets.get(name)
+        if asset is not None and self.reload:
+            try:
+                if os.stat(asset.path).st_mtime != asset.mtime:
+                    asset = self.assets[name] = Asset(asset.path)
+            except OSError:
+                pass  # Deleted while running: keep serving the loaded copy
+        return asset
+
+    def response(self, name: str, request: Request) -> Response:
+        asset = self.get(name)
+        if asset is None:
+            return Response("Not Found", status_code=404, media_type="text/plain")
+        use_gzip = asset.gzip_body is not None and "gzip" in request.headers.get("accept-encoding", "")
+        etag = asset.gzip_etag if use_gzip else asset.etag
+        # Unhashed file names: cache, but check back with the server before each use
+        headers = {"ETag": etag, "Cache-Control": "no-cache", "Vary": "Accept-Encoding"}
+        if_none_match = request.headers.get("if-none-match", "")
+        if etag in if_none_match or if_none_match.strip() == "*":
+            return Response(status_code=304, headers=headers)
+        if use_gzip:
+            headers["Content-Encoding"] = "gzip"
+            return Response(asset.gzip_body, media_type=asset.media_type, headers=headers)
+        return Response(asset.body, media_type=asset.media_type, headers=headers)
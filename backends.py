@@ -0,0 +1,238 @@
+import os
+import json
+import time
+import types
+import asyncio
+import httpx
+import metrics
+from http_client import close_with_loop
+
+# Ollama instances the agent can use. Comma-separated base URLs, each with an
+# optional "|model" suffix, e.g. "http://box1:11434/v1|mistral,http://box2:11434/v1".
+# LLM_BACKENDS_FILE takes a JSON list of {"url": ..., "model": ...} instead.
+LLM_ENDPOINTS = os.getenv("LLM_ENDPOINTS", "http://localhost:11434/v1")
+LLM_BACKENDS_FILE = os.getenv("LLM_BACKENDS_FILE")
+LLM_MODEL = os.getenv("LLM_MODEL")  # Overrides the model named in requests, unless set per endpoint
+
+HEALTH_INTERVAL = float(os.getenv("LLM_HEALTH_INTERVAL", "10"))      # Seconds between probes
+RETRIES = int(os.getenv("LLM_RETRIES", "2"))                         # Extra backends tried per call
+BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "3"))       # Consecutive failures to open
+BREAKER_COOLDOWN = float(os.getenv("LLM_BREAKER_COOLDOWN", "30"))    # Seconds before a trial call
+CONNECT_TIMEOUT = float(os.getenv("LLM_CONNECT_TIMEOUT", "3"))
+READ_TIMEOUT = float(os.getenv("LLM_READ_TIMEOUT", "300"))           # CPU prefill can be slow
+MAX_CONNECTIONS = int(os.getenv("LLM_MAX_CONNECTIONS", "16"))        # Per backend
+KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", "60"))
+
+BACKEND_CALLS = metrics.register(metrics.Counter(
+    "llm_backend_calls_total", "LLM calls per backend by outcome", ("backend", "outcome")))
+
+
+def openai_module():
+    # Imported on first use: openai is the slowest import in the process (~0.4s),
+    # and a server worker should be accepting connections before it needs it
+    import openai
+    return openai
+
+
+def is_retryable(error: BaseException) -> bool:
+    # Failures that say nothing about the request itself: try another backend
+    openai = openai_module()
+    return isinstance(error, (openai.APIConnectionError, openai.InternalServerError))
+
+
+def total_llm_slots(backend_count: int = None) -> int:
+    """LLM calls the whole server may run at once: LLM_CONCURRENCY, else two per backend."""
+    if "LLM_CONCURRENCY" in os.environ:
+        return int(os.environ["LLM_CONCURRENCY"])
+    return 2 * (backend_count if backend_count is not None else len(load_endpoints()))
+
+
+def load_endpoints() -> list:
+    if LLM_BACKENDS_FILE:
+        with open(LLM_BACKENDS_FILE, encoding="utf-8") as f:
+            return [(entry["url"], entry.get("model") or LLM_MODEL) for entry in json.load(f)]
+    endpoints = []
+    for entry in LLM_ENDPOINTS.split(","):
+        if entry.strip():
+            url, _, model = entry.strip().partition("|")
+            endpoints.append((url, model or LLM_MODEL))
+    return endpoints
+
+
+class Backend:
+    def __init__(self, url: str, model: str = None):
+        self.url = url.rstrip("/")
+        self.model = model
+        self.outstanding = 0
+        self.failures = 0           # Consecutive
+        self.open_until = 0.0       # Circuit breaker: skipped until this monotonic time
+        self.trial = False          # Half-open breaker: the one trial call is in flight
+        self.healthy = True         # Last probe result
+        self.latency = None         # EWMA of time to response headers, seconds
+        self._client = None
+        self._client_loop = None
+
+    def client(self):
+        # Pooled connections cannot move between event loops (the CLI runs one loop per
+        # question), so there is one client per loop, closed when that loop shuts down
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._client_loop is not loop:
+            http = httpx.AsyncClient(
+                limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS,
+                                    keepalive_expiry=KEEPALIVE_EXPIRY),
+                timeout=httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+            )
+            # Retries are the pool's job, so they can go to a different backend
+            self._client = openai_module().AsyncOpenAI(base_url=self.url, api_key="ollama", http_client=http, max_retries=0)
+            self._client_loop = loop
+            close_with_loop(self._client.close)
+        return self._client
+
+    def half_open(self, now: float) -> bool:
+        return self.failures >= BREAKER_FAILURES and now >= self.open_until
+
+    def available(self, now: float) -> bool:
+        # Once the cooldown is over an open breaker lets one trial call through;
+        # its outcome closes the breaker or opens it for another cooldown
+        if not self.healthy or now < self.open_until:
+            return False
+        return not (self.trial and self.half_open(now))
+
+    def succeeded(self, elapsed: float):
+        self.failures = 0
+        self.open_until = 0.0
+        self.healthy = True
+        self.latency = elapsed if self.latency is None else 0.8 * self.latency + 0.2 * elapsed
+
+    def failed(self):
+        self.failures += 1
+        if self.failures >= BREAKER_FAILURES:
+            self.open_until = time.monotonic() + BREAKER_COOLDOWN
+
+
+class PooledStream:
+    """A backend's completion stream that keeps the backend's outstanding count until closed."""
+
+    def __init__(self, stream, backend: Backend):
+        self.stream = stream
+        self.backend = backend
+        self.closed = False
+
+    def __aiter__(self):
+        return self.stream.__aiter__()
+
+    async def close(self):
+        if not self.closed:
+            self.closed = True
+            self.backend.outstanding -= 1
+            await self.stream.close()
+
+
+class BackendPool:
+    """
+    Spreads LLM calls over several OpenAI-compatible endpoints. Each call goes
+    to the available backend with the fewest outstanding requests; connection
+    errors and 5xx answers are retried on another backend. Backends that keep
+    failing are skipped for BREAKER_COOLDOWN seconds and then get a single trial
+    call, and a background probe marks unreachable ones unhealthy until they
+    answer again.
+    Exposes `chat.completions.create`, so it drops in where an AsyncOpenAI client was used.
+    """
+
+    def __init__(self, endpoints: list):
+        self.backends = [Backend(url, model) for url, model in endpoints]
+        self.chat = types.SimpleNamespace(completions=self)
+        self._probe_task = None
+        self._probe_loop = None
+
+    def pick(self, exclude=()) -> Backend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b not in exclude and b.available(now)]
+        if not candidates:
+            # Everything looks sick - still try rather than fail without a request
+            candidates = [b for b in self.backends if b not in exclude]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda b: (b.outstanding, b.latency or 0.0))
+
+    async def create(self, **request):
+        self._ensure_probe()
+        tried = []
+        error = None
+        for _ in range(1 + RETRIES):
+            backend = self.pick(tried)
+            if backend is None:
+                break
+            tried.append(backend)
+            call = {**request, "model": backend.model} if backend.model else request
+            backend.outstanding += 1
+            trial = not backend.trial and backend.half_open(time.monotonic())
+            backend.trial = backend.trial or trial
+            start = time.perf_counter()
+            try:
+                response = await backend.client().chat.completions.create(**call)
+            except asyncio.CancelledError:
+                # The caller gave up (deadline, disconnect); says nothing about the backend
+                backend.outstanding -= 1
+                BACKEND_CALLS.inc(backend=backend.url, outcome="cancelled")
+                raise
+            except Exception as e:
+                backend.outstanding -= 1
+                if not is_retryable(e):
+                    BACKEND_CALLS.inc(backend=backend.url, outcome="error")
+                    raise
+                backend.failed()
+                BACKEND_CALLS.inc(backend=backend.url, outcome="retried")
+                error = e
+                continue
+            finally:
+                if trial:
+                    backend.trial = False
+            backend.succeeded(time.perf_counter() - start)
+            BACKEND_CALLS.inc(backend=backend.url, outcome="ok")
+            if request.get("stream"):
+                return PooledStream(response, backend)
+            backend.outstanding -= 1
+            return response
+        raise error or RuntimeError("No LLM backends configured")
+
+    def _ensure_probe(self):
+        if HEALTH_INTERVAL <= 0 or len(self.backends) < 2:
+            return
+        loop = asyncio.get_running_loop()
+        if self._probe_task is None or self._probe_task.done() or self._probe_loop is not loop:
+            self._probe_task = loop.create_task(self._probe_forever())
+            self._probe_loop = loop
+
+    async def probe(self, backend: Backend):
+        try:
+            await asyncio.wait_for(backend.client().models.list(), CONNECT_TIMEOUT + 2)
+        except Exception:
+            backend.healthy = False
+            return
+        if not backend.healthy:
+            # Back from the dead: give it a clean slate
+            backend.failures = 0
+            backend.open_until = 0.0
+        backend.healthy = True
+
+    async def _probe_forever(self):
+        while True:
+            await asyncio.gather(*(self.probe(backend) for backend in self.backends))
+            await asyncio.sleep(HEALTH_INTERVAL)
+
+    def healthy_count(self) -> int:
+        now = time.monotonic()
+        return sum(backend.available(now) for backend in self.backends)
+
+    async def aclose(self):
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            self._probe_task = None
+        for backend in self.backends:
+            if backend._client is not None:
+                await backend._client.close()
+                backend._client = None
+
+
+backend_pool = BackendPool(load_endpoints())
@@ -0,0 +1,144 @@
+# Batch mode: many questions through stream_agent with bounded concurrency.
+#
+# Used by POST /api/batch (NDJSON stream) and from the command line:
+#
+#     python batch.py questions.txt --concurrency 8 --output results.ndjson
+#     python batch.py questions.jsonl            # lines of {"id": ..., "question": ...}
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import coalesce
+import main
+
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "8"))   # Default questions in flight per batch
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "32"))
+BATCH_MAX_ITEMS = int(os.getenv("BATCH_MAX_ITEMS", "1000"))
+BATCH_QUEUE_SHARE = float(os.getenv("BATCH_QUEUE_SHARE", "0.5"))  # Part of the LLM queue all batches may fill
+
+_gate = None
+_gate_loop = None
+
+
+def batch_limit() -> int:
+    """Batch questions this worker runs at once, over all batches."""
+    return max(1, int(main.llm_limiter.max_queue * BATCH_QUEUE_SHARE))
+
+
+def batch_gate() -> asyncio.Semaphore:
+    """
+    Worker-wide cap on batch questions in flight, across all batches. Each question
+    waits for at most one LLM call at a time, so batches never fill more than
+    BATCH_QUEUE_SHARE of the LLM queue and interactive chats keep the rest.
+    Rebuilt when the event loop changes, like http_client's client.
+    """
+    global _gate, _gate_loop
+    loop = asyncio.get_running_loop()
+    if _gate is None or _gate_loop is not loop:
+        _gate = asyncio.Semaphore(batch_limit())
+        _gate_loop = loop
+    return _gate
+
+
+async def run_question(question: str, client_id: str = None) -> dict:
+    """Run one question to completion; returns the answer (or error) with its timing."""
+    start = time.perf_counter()
+    result = {"answer": None, "error": None, "path": None, "timing": None}
+    try:
+        async for event in main.stream_agent(question, client_id=client_id, include_timing=True):
+            etype = event["type"]
+            if etype == "answer":
+                result["answer"] = event["content"]
+            elif etype in ("error", "timeout"):
+                result["error"] = event["content"]
+            elif etype == "route":
+                result["path"] = event["content"]
+            elif etype == "timing":
+                result["timing"] = event["content"]
+    except Exception as e:
+        result["error"] = str(e)
+    result["latency_ms"] = round(1000 * (time.perf_counter() - start), 2)
+    return result
+
+
+async def run_batch(items: list, concurrency: int = None, client_id: str = None):
+    """
+    Async generator over results as they complete, one dict per item, then a
+    final {"type": "summary"}. Items are questions or {"id": ..., "question": ...}
+    dicts. Identical questions (ignoring case and whitespace) run once and the
+    result is reported for every copy, with "duplicate_of" naming the first.
+    """
+    gate = batch_gate()
+    concurrency = min(max(concurrency or BATCH_CONCURRENCY, 1), BATCH_MAX_CONCURRENCY, batch_limit())
+    semaphore = asyncio.Semaphore(concurrency)
+    started = time.perf_counter()
+
+    # Normalized question -> indexes of the items asking it
+    groups = {}
+    questions = []
+    for index, item in enumerate(items):
+        question = item["question"] if isinstance(item, dict) else item
+        questions.append(question)
+        groups.setdefault(coalesce.normalize_message(question), []).append(index)
+
+    async def run_group(indexes):
+        async with semaphore, gate:
+            return indexes, await run_question(questions[indexes[0]], client_id)
+
+    tasks = [asyncio.create_task(run_group(indexes)) for indexes in groups.values()]
+    answered = errors = 0
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            indexes, result = await next_done
+            for index in indexes:
+                item = items[index]
+                line = {"type": "result", "index": index, "question": questions[index], **result}
+                if isinstance(item, dict) and "id" in item:
+                    line["id"] = item["id"]
+                if index != indexes[0]:
+                    line["duplicate_of"] = indexes[0]
+                if result["error"]:
+                    errors += 1
+                else:
+                    answered += 1
+                yield line
+    finally:
+        # The caller went away (e.g. HTTP client disconnected): stop the rest
+        for task in tasks:
+            task.cancel()
+
+    yield {"type": "summary", "items": len(items), "unique": len(groups), "answered": answered,
+           "errors": errors, "concurrency": concurrency,
+           "duration_ms": round(1000 * (time.perf_counter() - started), 2)}
+
+
+def load_items(path: str) -> list:
+    """Plain text with one question per line, or JSONL of {"id": ..., "question": ...}."""
+    with open(path, encoding="utf-8") as f:
+        lines = [line.strip() for line in f if line.strip()]
+    if path.endswith((".jsonl", ".ndjson")):
+        return [json.loads(line) for line in lines]
+    return lines
+
+
+async def main_async(args):
+    items = load_items(args.questions)
+    out = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    try:
+        async for line in run_batch(items, args.concurrency, client_id="batch-cli"):
+            out.write(json.dumps(line) + "\n")
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Answer a file of questions with the agent, NDJSON out")
+    parser.add_argument("questions", help="Text file (one question per line) or .jsonl with id/question")
+    parser.add_argument("--concurrency", type=int, default=BATCH_CONCURRENCY)
+    parser.add_argument("--output", help="Write NDJSON here instead of stdout")
+    args = parser.parse_args()
+    asyncio.run(main_async(args))
@@ -0,0 +1,296 @@
+# Offline load test / latency benchmark for the agent.
+#
+# Starts mock_ollama in-process, swaps the agent's tools for stubs with a fixed
+# delay, then drives either stream_agent directly ("agent" target) or the real
+# FastAPI app over HTTP ("http" target) at a given concurrency.
+#
+#     python bench.py --requests 200 --concurrency 20 --output bench.json
+#     python bench.py --target http --token-delay 0.02 --ttft 0.5
+import json
+import time
+import random
+import asyncio
+import argparse
+import threading
+import contextvars
+import httpx
+import uvicorn
+from openai import AsyncOpenAI
+import main
+import router
+from cache import ToolCache, wrap_actions
+from mock_ollama import MockModel, create_app, load_rules
+from metrics import percentile
+
+DEFAULT_QUESTIONS = [
+    "Hi",
+    "What is the weather in London?",
+    "Who is the CEO of Google?",
+    "Explain the difference between TCP and UDP",
+    "2 * 3.5 + 10",
+    "What is the response time for example.com?",
+]
+
+# Events that show real progress. The opening "Thinking..." thought and the route
+# are sent before any work starts, so timing them would measure nothing.
+PROGRESS_EVENTS = ("tool", "queue", "answer", "answer_delta")
+
+# Per-request phase timings (filled by the wrappers below)
+current_phases = contextvars.ContextVar("current_phases", default=None)
+phase_samples = {"llm": [], "tool": []}
+
+
+def summarize(values: list) -> dict:
+    # Milliseconds, rounded for readable JSON
+    return {
+        "count": len(values),
+        "mean": round(1000 * sum(values) / len(values), 2) if values else 0.0,
+        "p50": round(1000 * percentile(values, 50), 2),
+        "p95": round(1000 * percentile(values, 95), 2),
+        "p99": round(1000 * percentile(values, 99), 2),
+        "max": round(1000 * max(values), 2) if values else 0.0,
+    }
+
+
+def record_phase(name: str, elapsed: float):
+    phase_samples[name].append(elapsed)
+    phases = current_phases.get()
+    if phases is not None:
+        phases[name] = phases.get(name, 0.0) + elapsed
+
+
+def install_stubs(tool_delay: float, jitter: float, use_cache: bool):
+    """Replace the network tools with fixed-latency stubs and time every LLM/tool call."""
+    async def stub_weather(city: str) -> str:
+        await asyncio.sleep(tool_delay + random.uniform(0, jitter))
+        return f"Current weather in {city}: Partly cloudy +10°C"
+
+    async def stub_search(query: str, max_results: int = None, sentences: int = None) -> str:
+        await asyncio.sleep(tool_delay + random.uniform(0, jitter))
+        return f"Result ('{query}'):\nStub summary for {query}."
+
+    async def stub_response_time(url: str) -> str:
+        await asyncio.sleep(tool_delay + random.uniform(0, jitter))
+        return f"{tool_delay:.2f} seconds"
+
+    stubs = {
+        "get_response_time": stub_response_time,
+        "calculate": main.available_actions["calculate"],
+        "web_search": stub_search,
+        "get_weather": stub_weather,
+    }
+    table = wrap_actions(stubs, ToolCache(path=None)) if use_cache else stubs
+
+    def timed(func):
+        async def wrapper(**params):
+            start = time.perf_counter()
+            try:
+                if asyncio.iscoroutinefunction(func):
+                    return await func(**params)
+                return func(**params)
+            finally:
+                record_phase("tool", time.perf_counter() - start)
+        return wrapper
+
+    main.tools.clear()
+    main.tools.update({name: timed(func) for name, func in table.items()})
+
+    original_chunks = main.llm_chunks
+    original_complete = main.llm_complete
+
+    def timed_chunks(request, lease=None):
+        async def chunks():
+            start = time.perf_counter()
+            inner = original_chunks(request, lease)
+            try:
+                async for chunk in inner:
+                    yield chunk
+            finally:
+                await inner.aclose()
+                record_phase("llm", time.perf_counter() - start)
+        return chunks()
+
+    async def timed_complete(request, lease=None):
+        start = time.perf_counter()
+        try:
+            return await original_complete(request, lease)
+        finally:
+            record_phase("llm", time.perf_counter() - start)
+
+    main.llm_chunks = timed_chunks
+    main.llm_complete = timed_complete
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run_one_agent(question: str) -> dict:
+    phases = {}
+    token = current_phases.set(phases)
+    start = time.perf_counter()
+    result = {"question": question, "first_event": None, "first_answer": None, "path": None, "error": None}
+    try:
+        async for event in main.stream_agent(question, client_id=f"bench-{random.randint(0, 9999)}"):
+            now = time.perf_counter() - start
+            if event["type"] in PROGRESS_EVENTS and result["first_event"] is None:
+                result["first_event"] = now
+            if event["type"] in ("answer", "answer_delta") and result["first_answer"] is None:
+                result["first_answer"] = now
+            if event["type"] == "route":
+                result["path"] = event["content"]
+            if event["type"] == "error":
+                result["error"] = event["content"]
+    except Exception as e:
+        result["error"] = str(e)
+    finally:
+        current_phases.reset(token)
+    result["latency"] = time.perf_counter() - start
+    result["phases"] = phases
+    return result
+
+
+async def run_one_http(client: httpx.AsyncClient, url: str, question: str) -> dict:
+    start = time.perf_counter()
+    result = {"question": question, "first_event": None, "first_answer": None, "path": None, "error": None,
+              "phases": {}}
+    try:
+        async with client.stream("POST", url, json={"message": question},
+                                 headers={"X-Client-Id": f"bench-{random.randint(0, 9999)}"}) as response:
+            if response.status_code != 200:
+                result["error"] = f"HTTP {response.status_code}"
+            else:
+                async for line in response.aiter_lines():
+                    if not line.startswith("data: ") or line == "data: [DONE]":
+                        continue
+                    event = json.loads(line[6:])
+                    now = time.perf_counter() - start
+                    if event["type"] in PROGRESS_EVENTS and result["first_event"] is None:
+                        result["first_event"] = now
+                    if event["type"] in ("answer", "answer_delta") and result["first_answer"] is None:
+                        result["first_answer"] = now
+                    if event["type"] == "route":
+                        result["path"] = event["content"]
+                    if event["type"] == "error":
+                        result["error"] = event["content"]
+    except Exception as e:
+        result["error"] = str(e)
+    result["latency"] = time.perf_counter() - start
+    return result
+
+
+async def drive(args, questions: list) -> tuple:
+    semaphore = asyncio.Semaphore(args.concurrency)
+    client = None
+    url = None
+    if args.target == "http":
+        import server
+        # Every simulated user connects from 127.0.0.1 and is told apart by X-Client-Id
+        server.TRUSTED_PROXIES.add("127.0.0.1")
+        start_server(server.app, args.server_port)
+        url = f"http://127.0.0.1:{args.server_port}/api/chat"
+        client = httpx.AsyncClient(timeout=None, limits=httpx.Limits(max_connections=args.concurrency))
+
+    async def worker(question):
+        async with semaphore:
+            if client is not None:
+                return await run_one_http(client, url, question)
+            return await run_one_agent(question)
+
+    started = time.perf_counter()
+    results = await asyncio.gather(*(worker(question) for question in questions))
+    duration = time.perf_counter() - started
+    if client is not None:
+        await client.aclose()
+    return results, duration
+
+
+def build_report(args, results: list, duration: float, mock: MockModel) -> dict:
+    ok = [r for r in results if not r["error"]]
+    paths = {}
+    for r in results:
+        paths[r["path"] or "none"] = paths.get(r["path"] or "none", 0) + 1
+    per_request_phases = {}
+    for r in ok:
+        for name, elapsed in r["phases"].items():
+            per_request_phases.setdefault(name, []).append(elapsed)
+
+    return {
+        "config": {key: value for key, value in vars(args).items() if key not in ("output",)},
+        "requests": len(results),
+        "errors": len(results) - len(ok),
+        "error_samples": sorted({r["error"] for r in results if r["error"]})[:5],
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(results) / duration, 2) if duration else 0.0,
+        "latency_ms": summarize([r["latency"] for r in ok]),
+        "first_event_ms": summarize([r["first_event"] for r in ok if r["first_event"] is not None]),
+        "first_answer_ms": summarize([r["first_answer"] for r in ok if r["first_answer"] is not None]),
+        "phases_ms": {
+            "llm_call": summarize(phase_samples["llm"]),
+            "tool_call": summarize(phase_samples["tool"]),
+            **{f"{name}_per_request": summarize(values) for name, values in per_request_phases.items()},
+        },
+        "paths": paths,
+        "llm_requests": mock.requests,
+        "limiter": main.llm_limiter.stats(),
+    }
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description="Offline latency benchmark for the agent")
+    parser.add_argument("--target", choices=["agent", "http"], default="agent",
+                        help="Drive stream_agent in-process or POST to /api/chat")
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--questions", help="File with one question per line (default: built-in mix)")
+    parser.add_argument("--token-delay", type=float, default=0.01)
+    parser.add_argument("--ttft", type=float, default=0.1)
+    parser.add_argument("--prefill-per-token", type=float, default=0.0)
+    parser.add_argument("--rules", help="JSON rules file for the mock model")
+    parser.add_argument("--tool-delay", type=float, default=0.2, help="Stub tool latency in seconds")
+    parser.add_argument("--tool-jitter", type=float, default=0.05)
+    parser.add_argument("--tool-cache", action="store_true", help="Put the stub tools behind the result cache")
+    parser.add_argument("--no-router", action="store_true", help="Disable the fast-path router")
+    parser.add_argument("--llm-concurrency", type=int, help="Override LLM_CONCURRENCY")
+    parser.add_argument("--mock-port", type=int, default=11500)
+    parser.add_argument("--server-port", type=int, default=8765)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    if args.questions:
+        with open(args.questions, encoding="utf-8") as f:
+            pool = [line.strip() for line in f if line.strip()]
+    else:
+        pool = DEFAULT_QUESTIONS
+    questions = [pool[i % len(pool)] for i in range(args.requests)]
+
+    mock = MockModel(load_rules(args.rules) if args.rules else None, args.token_delay, args.ttft,
+                     args.prefill_per_token)
+    start_server(create_app(mock), args.mock_port)
+    main.client = AsyncOpenAI(base_url=f"http://127.0.0.1:{args.mock_port}/v1", api_key="mock")
+
+    install_stubs(args.tool_delay, args.tool_jitter, args.tool_cache)
+    if args.no_router:
+        router.ROUTER_ENABLED = False
+    if args.llm_concurrency:
+        main.llm_limiter.max_concurrent = args.llm_concurrency
+
+    results, duration = asyncio.run(drive(args, questions))
+    report = build_report(args, results, duration, mock)
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,237 @@
+import os
+import json
+import asyncio
+import time
+import sqlite3
+import threading
+import functools
+from collections import OrderedDict
+
+# Per-tool time-to-live in seconds. None = never expires, 0 = never cached.
+DEFAULT_TTLS = {
+    "get_weather": 10 * 60,         # Weather changes, but not every request
+    "web_search": 6 * 60 * 60,      # Wikipedia summaries are stable for hours
+    "calculate": None,              # Pure function
+    "get_response_time": 0,         # A latency probe has to hit the network
+}
+
+CACHE_SIZE = int(os.getenv("TOOL_CACHE_SIZE", "1024"))
+CACHE_PATH = os.getenv("TOOL_CACHE_PATH")  # Optional sqlite file to survive restarts
+
+
+def normalize_params(params: dict) -> dict:
+    # Fold case and whitespace so "London" and " london " share an entry
+    normalized = {}
+    for key, value in params.items():
+        if isinstance(value, str):
+            value = " ".join(value.split()).casefold()
+        normalized[key] = value
+    return normalized
+
+
+def make_key(function_name: str, params: dict) -> str:
+    # Same idea as the action dedup key in stream_agent
+    return json.dumps({"function_name": function_name,
+                       "function_params": normalize_params(params)}, sort_keys=True)
+
+
+class DiskBackend:
+    """Small sqlite key/value store used behind the in-memory LRU."""
+
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        # Several server workers may share the file: WAL lets them read while one writes
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS tool_cache (key TEXT PRIMARY KEY, value TEXT, expires REAL)"
+        )
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def get(self, key: str):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT value, expires FROM tool_cache WHERE key = ?", (key,)
+            ).fetchone()
+        return row
+
+    def set(self, key: str, value: str, expires):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO tool_cache (key, value, expires) VALUES (?, ?, ?)",
+                (key, value, expires)
+            )
+            self.conn.commit()
+
+    def delete(self, key: str):
+        with self.lock:
+            self.conn.execute("DELETE FROM tool_cache WHERE key = ?", (key,))
+            self.conn.commit()
+
+    def prune(self, max_rows: int):
+        # Drop expired rows, then the oldest-expiring ones beyond max_rows
+        with self.lock:
+            self.conn.execute(
+                "DELETE FROM tool_cache WHERE expires IS NOT NULL AND expires < ?", (time.time(),)
+            )
+            self.conn.execute(
+                "DELETE FROM tool_cache WHERE key NOT IN "
+                "(SELECT key FROM tool_cache ORDER BY expires IS NULL DESC, expires DESC LIMIT ?)",
+                (max_rows,)
+            )
+            self.conn.commit()
+
+
+class ToolCache:
+    """
+    Process-wide TTL + LRU cache for tool results.
+    Entries are (value, expires_at) pairs; expires_at is None for entries that never expire.
+    """
+
+    def __init__(self, max_size: int = CACHE_SIZE, ttls: dict = None, path: str = CACHE_PATH):
+        self.max_size = max_size
+        self.ttls = dict(DEFAULT_TTLS if ttls is None else ttls)
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.disk = DiskBackend(path) if path else None
+        self.hits = 0
+        self.misses = 0
+        self._disk_writes = 0
+
+    def ttl_for(self, function_name: str):
+        return self.ttls.get(function_name, 0)
+
+    def get(self, key: str):
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self.disk:
+            value = self._disk_get(key, now)
+        self._count(value)
+        return value
+
+    async def aget(self, key: str):
+        """get() for the event loop: the disk tier can block (fsync, another worker
+        holding the write lock), so it is read in a thread."""
+        now = time.time()
+        value = self._memory_get(key, now)
+        if value is None and self.disk:
+            value = await asyncio.to_thread(self._disk_get, key, now)
+        self._count(value)
+        return value
+
+    def set(self, key: str, value: str, ttl):
+        expires = None if ttl is None else time.time() + ttl
+        self._remember(key, value, expires)
+        if self.disk:
+            self._disk_set(key, value, expires)
+
+    async def aset(self, key: str, value: str, ttl):
+        expires = None if ttl is None else time.time() + ttl
+        self._remember(key, value, expires)
+        if self.disk:
+            await asyncio.to_thread(self._disk_set, key, value, expires)
+
+    def _memory_get(self, key: str, now: float):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                value, expires = entry
+                if expires is None or expires > now:
+                    self.entries.move_to_end(key)
+                    return value
+                del self.entries[key]
+        return None
+
+    def _disk_get(self, key: str, now: float):
+        row = self.disk.get(key)
+        if row is None:
+            return None
+        value, expires = row
+        if expires is None or expires > now:
+            self._remember(key, value, expires)
+            return value
+        self.disk.delete(key)
+        return None
+
+    def _disk_set(self, key: str, value: str, expires):
+        self.disk.set(key, value, expires)
+        with self.lock:
+            self._disk_writes += 1
+            prune = self._disk_writes % 100 == 0
+        if prune:
+            self.disk.prune(self.max_size * 10)
+
+    def _count(self, value):
+        with self.lock:
+            if value is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _remember(self, key: str, value: str, expires):
+        with self.lock:
+            self.entries[key] = (value, expires)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)  # Evict least recently used
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> dict:
+        with self.lock:
+            return {"size": len(self.entries), "max_size": self.max_size,
+                    "hits": self.hits, "misses": self.misses}
+
+
+tool_cache = ToolCache()
+
+
+def is_cacheable(result) -> bool:
+    # Never cache failures - the next call might succeed
+    return isinstance(result, str) and not result.startswith(("Error", "Could not"))
+
+
+def cached_tool(function_name: str, func, cache: ToolCache = None):
+    cache = cache or tool_cache
+
+    if asyncio.iscoroutinefunction(func):
+        @functools.wraps(func)
+        async def async_wrapper(**params):
+            ttl = cache.ttl_for(function_name)
+            if ttl == 0:
+                return await func(**params)
+            key = make_key(function_name, params)
+            result = await cache.aget(key)
+            if result is not None:
+                return result
+            result = await func(**params)
+            if is_cacheable(result):
+                await cache.aset(key, result, ttl)
+            return result
+
+        return async_wrapper
+
+    @functools.wraps(func)
+    def wrapper(**params):
+        ttl = cache.ttl_for(function_name)
+        if ttl == 0:
+            return func(**params)
+        key = make_key(function_name, params)
+        result = cache.get(key)
+        if result is not None:
+            return result
+        result = func(**params)
+        if is_cacheable(result):
+            cache.set(key, result, ttl)
+        return result
+
+    return wrapper
+
+
+def wrap_actions(actions: dict, cache: ToolCache = None) -> dict:
+    """Return a copy of an actions table with every tool going through the cache."""
+    return {name: cached_tool(name, func, cache) for name, func in actions.items()}
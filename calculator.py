@@ -0,0 +1,203 @@
+import os
+import re
+import ast
+import math
+import operator
+import functools
+
+# Cost caps: an expression is rejected before doing work that would blow past them
+MAX_LENGTH = int(os.getenv("CALC_MAX_LENGTH", "500"))        # Characters per expression
+MAX_NODES = int(os.getenv("CALC_MAX_NODES", "200"))          # AST nodes per expression
+MAX_INT_BITS = int(os.getenv("CALC_MAX_INT_BITS", "4096"))   # ~1200 digits
+MAX_BATCH = int(os.getenv("CALC_MAX_BATCH", "50"))           # Expressions per batch call
+CACHE_SIZE = int(os.getenv("CALC_CACHE_SIZE", "1024"))       # Compiled expressions kept
+
+
+class CalculationError(ValueError):
+    pass
+
+
+def _check_int(value):
+    if isinstance(value, int) and value.bit_length() > MAX_INT_BITS:
+        raise CalculationError("result is too large")
+    return value
+
+
+def _estimated_bits(base, exponent) -> float:
+    return exponent * math.log2(abs(base)) if abs(base) > 1 else 0.0
+
+
+def _pow(base, exponent, modulus=None):
+    if modulus is not None:
+        # Modular exponentiation stays small whatever the exponent
+        return pow(base, exponent, modulus)
+    if isinstance(base, int) and isinstance(exponent, int) and exponent >= 0:
+        if _estimated_bits(base, exponent) > MAX_INT_BITS:
+            raise CalculationError("result is too large")
+        return pow(base, exponent)
+    if isinstance(base, (int, float)) and isinstance(exponent, (int, float)):
+        # math.pow raises OverflowError instead of building a huge number
+        return math.pow(base, exponent)
+    return pow(base, exponent)
+
+
+def _mul(a, b):
+    if isinstance(a, int) and isinstance(b, int) and a.bit_length() + b.bit_length() > MAX_INT_BITS + 1:
+        raise CalculationError("result is too large")
+    return a * b
+
+
+def _log2_factorial(n) -> float:
+    return math.lgamma(n + 1) / math.log(2)
+
+
+def _factorial(n):
+    if not isinstance(n, int) or n < 0:
+        raise CalculationError("factorial() needs a non-negative integer")
+    if _log2_factorial(n) > MAX_INT_BITS:
+        raise CalculationError("result is too large")
+    return math.factorial(n)
+
+
+def _comb(n, k):
+    if isinstance(n, int) and isinstance(k, int) and 0 <= k <= n:
+        if _log2_factorial(n) - _log2_factorial(k) - _log2_factorial(n - k) > MAX_INT_BITS:
+            raise CalculationError("result is too large")
+    return math.comb(n, k)
+
+
+def _perm(n, k=None):
+    if isinstance(n, int) and n >= 0:
+        k = n if k is None else k
+        if isinstance(k, int) and 0 <= k <= n and _log2_factorial(n) - _log2_factorial(n - k) > MAX_INT_BITS:
+            raise CalculationError("result is too large")
+    return math.perm(n, k)
+
+
+def _round(value, digits=None):
+    if digits is not None and abs(digits) > 100:
+        raise CalculationError("round() digits out of range")
+    return round(value, digits)
+
+
+def _log(value, base=None):
+    return math.log(value) if base is None else math.log(value, base)
+
+
+BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: _mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: _pow,
+}
+
+UNARY_OPERATORS = {ast.UAdd: operator.pos, ast.USub: operator.neg}
+
+FUNCTIONS = {
+    "abs": abs, "round": _round, "min": min, "max": max, "pow": _pow, "int": int, "float": float,
+    "sum": lambda *values: math.fsum(values),
+    "sqrt": math.sqrt, "cbrt": lambda x: math.copysign(abs(x) ** (1 / 3), x), "exp": math.exp,
+    "log": _log, "ln": math.log, "log10": math.log10, "log2": math.log2,
+    "sin": math.sin, "cos": math.cos, "tan": math.tan, "asin": math.asin, "acos": math.acos,
+    "atan": math.atan, "atan2": math.atan2, "sinh": math.sinh, "cosh": math.cosh, "tanh": math.tanh,
+    "degrees": math.degrees, "radians": math.radians, "hypot": math.hypot,
+    "floor": math.floor, "ceil": math.ceil, "trunc": math.trunc,
+    "factorial": _factorial, "comb": _comb, "perm": _perm, "gcd": math.gcd, "lcm": math.lcm,
+    "mean": lambda *values: math.fsum(values) / len(values),
+}
+
+CONSTANTS = {"pi": math.pi, "e": math.e, "tau": math.tau}
+
+
+def _normalize(expression: str) -> str:
+    # "^" is what people mean by power, and "×" / "÷" show up in pasted questions
+    return expression.strip().replace("^", "**").replace("×", "*").replace("÷", "/")
+
+
+def _compile_node(node):
+    """Turn a validated AST node into a closure that computes its value."""
+    if isinstance(node, ast.Constant):
+        if isinstance(node.value, bool) or not isinstance(node.value, (int, float)):
+            raise CalculationError(f"unsupported constant {node.value!r}")
+        value = _check_int(node.value)
+        return lambda: value
+    if isinstance(node, ast.Name):
+        if node.id not in CONSTANTS:
+            raise CalculationError(f"unknown name '{node.id}'")
+        value = CONSTANTS[node.id]
+        return lambda: value
+    if isinstance(node, ast.BinOp):
+        op = BINARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"operator {type(node.op).__name__} is not allowed")
+        left, right = _compile_node(node.left), _compile_node(node.right)
+        return lambda: _check_int(op(left(), right()))
+    if isinstance(node, ast.UnaryOp):
+        op = UNARY_OPERATORS.get(type(node.op))
+        if op is None:
+            raise CalculationError(f"operator {type(node.op).__name__} is not allowed")
+        operand = _compile_node(node.operand)
+        return lambda: op(operand())
+    if isinstance(node, ast.Call):
+        if not isinstance(node.func, ast.Name) or node.func.id not in FUNCTIONS:
+            name = node.func.id if isinstance(node.func, ast.Name) else ast.dump(node.func)
+            raise CalculationError(f"function '{name}' is not allowed")
+        if node.keywords:
+            raise CalculationError("keyword arguments are not supported")
+        func = FUNCTIONS[node.func.id]
+        args = [_compile_node(arg) for arg in node.args]
+        return lambda: _check_int(func(*(arg() for arg in args)))
+    raise CalculationError(f"{type(node).__name__} is not allowed in an expression")
+
+
+@functools.lru_cache(maxsize=CACHE_SIZE)
+def compile_expression(expression: str):
+    """Parse and validate an expression once; returns a zero-argument evaluator."""
+    expression = _normalize(expression)
+    if not expression:
+        raise CalculationError("empty expression")
+    if len(expression) > MAX_LENGTH:
+        raise CalculationError(f"expression is longer than {MAX_LENGTH} characters")
+    try:
+        tree = ast.parse(expression, mode="eval")
+    except SyntaxError as e:
+        raise CalculationError(f"invalid syntax: {e.msg}")
+    if sum(1 for _ in ast.walk(tree)) > MAX_NODES:
+        raise CalculationError(f"expression has more than {MAX_NODES} parts")
+    return _compile_node(tree.body)
+
+
+def evaluate(expression: str):
+    """Evaluate one expression. Raises CalculationError for anything invalid or too costly."""
+    evaluator = compile_expression(expression)
+    try:
+        return evaluator()
+    except CalculationError:
+        raise
+    except ZeroDivisionError:
+        raise CalculationError("division by zero")
+    except OverflowError:
+        raise CalculationError("result is too large")
+    except (ValueError, TypeError) as e:
+        raise CalculationError(str(e))
+
+
+def evaluate_many(expressions: list) -> list:
+    """Evaluate several expressions; each entry is a result or the CalculationError it raised."""
+    if len(expressions) > MAX_BATCH:
+        raise CalculationError(f"at most {MAX_BATCH} expressions per call")
+    results = []
+    for expression in expressions:
+        try:
+            results.append(evaluate(expression))
+        except CalculationError as e:
+            results.append(e)
+    return results
+
+
+def split_expressions(text: str) -> list:
+    # Several expressions in one tool call are separated by ";" or new lines
+    return [part.strip() for part in re.split(r"[;\n]", text) if part.strip()]
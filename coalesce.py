@@ -0,0 +1,134 @@
+import os
+import json
+import asyncio
+import metrics
+
+# Opt-in single-flight coalescing. The agent runs at temperature 0, so identical
+# concurrent work produces identical output and can be shared.
+COALESCE_REQUESTS = os.getenv("COALESCE_REQUESTS", "0") == "1"   # Whole /api/chat requests
+COALESCE_LLM = os.getenv("COALESCE_LLM", "0") == "1"             # Individual LLM requests
+COALESCE_TOOLS = os.getenv("COALESCE_TOOLS", "0") == "1"         # Individual tool calls
+
+COALESCED = metrics.register(metrics.Counter(
+    "coalesced_total", "Callers that joined an identical in-flight computation", ("kind",)))
+
+
+def normalize_message(message: str) -> str:
+    return " ".join(message.split()).casefold()
+
+
+def request_key(kwargs: dict) -> str:
+    return json.dumps(kwargs, sort_keys=True, default=str)
+
+
+class Flight:
+    def __init__(self):
+        self.items = []
+        self.done = False
+        self.error = None
+        self.subscribers = 0
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def publish(self, item):
+        self.items.append(item)
+        self._notify()
+
+    def finish(self):
+        self.done = True
+        self._notify()
+
+    def _notify(self):
+        # Wake every waiting subscriber, then start a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+
+class SingleFlight:
+    """
+    Shares one in-flight computation between identical concurrent callers.
+    The first caller for a key starts the producer in a background task; later
+    callers replay everything produced so far and then follow along live.
+    The producer is cancelled only when every subscriber has gone away.
+    """
+
+    def __init__(self, kind: str):
+        self.kind = kind    # Label for coalesced_total
+        self.flights = {}
+
+    def in_flight(self, key: str) -> bool:
+        return key in self.flights
+
+    async def _produce(self, key: str, flight: Flight, factory):
+        items = factory()
+        try:
+            async for item in items:
+                flight.publish(item)
+        except asyncio.CancelledError:
+            flight.error = asyncio.CancelledError()
+            raise
+        except Exception as e:
+            flight.error = e
+        finally:
+            await items.aclose()
+            flight.finish()
+            if self.flights.get(key) is flight:
+                del self.flights[key]
+
+    async def stream(self, key: str, factory, on_done=None):
+        """
+        Async generator over the items of `factory()` (an async generator), shared per key.
+        `on_done` (e.g. releasing an LLM slot) runs once the caller's resources are no
+        longer needed: when the producer ends if this call started the flight, even if
+        the caller leaves first, and right away if it joined a running one.
+        """
+        flight = self.flights.get(key)
+        if flight is None:
+            flight = self.flights[key] = Flight()
+            flight.task = asyncio.create_task(self._produce(key, flight, factory))
+            if on_done is not None:
+                # A done callback also runs if the task is cancelled before it starts
+                flight.task.add_done_callback(lambda _: on_done())
+        else:
+            COALESCED.inc(kind=self.kind)
+            if on_done is not None:
+                on_done()
+        flight.subscribers += 1
+        index = 0
+        try:
+            while True:
+                if index < len(flight.items):
+                    yield flight.items[index]
+                    index += 1
+                elif flight.done:
+                    if flight.error is not None and not isinstance(flight.error, asyncio.CancelledError):
+                        raise flight.error
+                    return
+                else:
+                    await flight.wait()
+        finally:
+            flight.subscribers -= 1
+            if flight.subscribers == 0 and not flight.done:
+                # Nobody is listening any more (e.g. stopped at PAUSE, client left)
+                flight.task.cancel()
+                if self.flights.get(key) is flight:
+                    del self.flights[key]
+
+    async def call(self, key: str, coro_factory, on_done=None):
+        """Await `coro_factory()` once per key, sharing the result with concurrent callers."""
+        async def single():
+            yield await coro_factory()
+
+        results = self.stream(key, single, on_done)
+        try:
+            return await results.__anext__()
+        finally:
+            await results.aclose()
+
+
+request_flights = SingleFlight("request")
+llm_flights = SingleFlight("llm")
+tool_flights = SingleFlight("tool")
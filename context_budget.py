@@ -0,0 +1,104 @@
+import os
+import re
+import functools
+from stream_parser import ACTION_PATTERN
+import metrics
+
+# Prefill dominates latency on CPU, so every turn's prompt is kept small:
+# large Observations are cut, old Thought text is dropped from history, and the
+# oldest tool exchanges go once the prompt would exceed PROMPT_BUDGET tokens.
+PROMPT_BUDGET = int(os.getenv("PROMPT_BUDGET", "3000"))
+OBSERVATION_MAX_TOKENS = int(os.getenv("OBSERVATION_MAX_TOKENS", "400"))
+DROP_THOUGHTS = os.getenv("CONTEXT_DROP_THOUGHTS", "1") != "0"
+
+# Rough stand-in for the model tokenizer: short letter runs, single digits and
+# punctuation each count as one token (Mistral splits numbers into digits).
+TOKEN_PATTERN = re.compile(r"[^\W\d_]{1,6}|\d|[^\w\s]|_")
+MESSAGE_OVERHEAD = 4  # Role markers and separators per chat message
+
+TRIMMED_OBSERVATIONS = metrics.register(metrics.Counter(
+    "agent_context_trimmed_observations_total", "Observations cut to OBSERVATION_MAX_TOKENS"))
+DROPPED_MESSAGES = metrics.register(metrics.Counter(
+    "agent_context_dropped_messages_total", "History messages dropped to stay within PROMPT_BUDGET"))
+
+
+@functools.lru_cache(maxsize=2048)
+def count_tokens(text: str) -> int:
+    return len(TOKEN_PATTERN.findall(text or ""))
+
+
+def messages_tokens(messages: list) -> int:
+    return sum(count_tokens(message.get("content") or "") + MESSAGE_OVERHEAD for message in messages)
+
+
+def _cut(text: str, max_tokens: int) -> str:
+    """Cut text to about max_tokens, preferring to end on a sentence or line."""
+    tokens = list(TOKEN_PATTERN.finditer(text))
+    if len(tokens) <= max_tokens:
+        return text
+    end = tokens[max_tokens - 1].end() if max_tokens > 0 else 0
+    head = text[:end]
+    boundary = max(head.rfind(". "), head.rfind("\n"))
+    if boundary > len(head) // 2:
+        head = head[:boundary + 1]
+    return head.rstrip() + f" ... [{len(tokens) - max_tokens} more tokens cut]"
+
+
+def compact_observation(text: str, max_tokens: int = None) -> str:
+    """
+    Shorten a tool result before it goes into the history. Combined results of
+    several calls ("[1] ...", "[2] ...") each get an equal share of the budget.
+    """
+    if max_tokens is None:
+        max_tokens = OBSERVATION_MAX_TOKENS
+    text = str(text)
+    if count_tokens(text) <= max_tokens:
+        return text
+    TRIMMED_OBSERVATIONS.inc()
+    parts = re.split(r"\n(?=\[\d+\] )", text)
+    share = max(max_tokens // len(parts), 1)
+    return "\n".join(_cut(part, share) for part in parts)
+
+
+def compact_reply(text: str) -> str:
+    """
+    History copy of an assistant reply that requested an Action: just the Action
+    block. The reasoning has served its purpose once the tool ran.
+    """
+    if not DROP_THOUGHTS:
+        return text
+    match = ACTION_PATTERN.search(text)
+    if not match:
+        return text
+    return f"Action:\n{match.group(1)}\nPAUSE"
+
+
+def fit_budget(messages: list, budget: int = None) -> list:
+    """
+    Messages to send this turn, at most `budget` tokens where possible.
+    The system prompt and the user's question are always kept as they are
+    (a byte-identical prefix lets Ollama reuse its prompt cache), as is the
+    latest exchange. Older exchanges - an assistant message and the
+    Observation/tool messages after it - are dropped oldest first.
+    """
+    if budget is None:
+        budget = PROMPT_BUDGET
+    if budget <= 0 or messages_tokens(messages) <= budget:
+        return messages
+
+    head, history = messages[:2], messages[2:]
+    exchanges = []
+    for message in history:
+        if message["role"] == "assistant" or not exchanges:
+            exchanges.append([])
+        exchanges[-1].append(message)
+
+    total = messages_tokens(messages)
+    dropped = 0
+    while len(exchanges) > 1 and total > budget:
+        oldest = exchanges.pop(0)
+        total -= messages_tokens(oldest)
+        dropped += len(oldest)
+    if dropped:
+        DROPPED_MESSAGES.inc(dropped)
+    return head + [message for exchange in exchanges for message in exchange]
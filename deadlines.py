@@ -0,0 +1,34 @@
+import os
+import time
+import contextvars
+
+# Wall-clock budget for one stream_agent request, in seconds (0 = no deadline).
+# LLM calls, queue waits and tools all share it; tools get whatever is left.
+REQUEST_DEADLINE = float(os.getenv("REQUEST_DEADLINE", "120"))
+
+# Monotonic time by which the current request must be done (None = unbounded)
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+
+def start(seconds: float):
+    current_deadline.set(time.monotonic() + seconds if seconds and seconds > 0 else None)
+
+
+def clear():
+    current_deadline.set(None)
+
+
+def remaining():
+    """Seconds left for the current request, or None without a deadline."""
+    deadline = current_deadline.get()
+    if deadline is None:
+        return None
+    return max(deadline - time.monotonic(), 0.0)
+
+
+def clamp(timeout: float, reserve: float = 0.0) -> float:
+    """`timeout`, shortened to what is left of the request's budget (minus `reserve`)."""
+    left = remaining()
+    if left is None:
+        return timeout
+    return max(min(timeout, left - reserve), 0.0)
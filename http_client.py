@@ -0,0 +1,87 @@
+import os
+import asyncio
+from urllib.parse import urlsplit
+import httpx
+import deadlines
+
+# Connection pool tuning for the shared tool HTTP client
+MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+MAX_KEEPALIVE = int(os.getenv("HTTP_MAX_KEEPALIVE", "20"))
+KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+PER_HOST_LIMIT = int(os.getenv("HTTP_PER_HOST_LIMIT", "10"))
+DEFAULT_TIMEOUT = 10.0
+
+# Wikipedia asks API clients for a descriptive User-Agent
+USER_AGENT = "CustomAgent/1.0 (https://github.com/Mansigopani2002/CustomAgent)"
+
+_client = None
+_client_loop = None
+_host_limits = {}
+_closers = set()    # Keeps the close_with_loop tasks referenced until they run
+
+
+def close_with_loop(aclose):
+    """
+    Await `aclose()` when the running event loop shuts down. asyncio.run() cancels
+    the tasks still pending at the end, and this one then closes a client on the
+    loop its pooled connections belong to (they cannot be closed from another).
+    """
+    async def wait_then_close():
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await aclose()
+
+    task = asyncio.get_running_loop().create_task(wait_then_close())
+    _closers.add(task)
+    task.add_done_callback(_closers.discard)
+
+
+def get_client() -> httpx.AsyncClient:
+    """
+    Return the shared keep-alive client for the running event loop.
+    The CLI runs each question in its own asyncio.run(), and pooled connections
+    cannot move between loops, so a new client is built when the loop changes.
+    Each client is closed when its loop shuts down.
+    """
+    global _client, _client_loop, _host_limits
+    loop = asyncio.get_running_loop()
+    if _client is None or _client_loop is not loop:
+        _client = httpx.AsyncClient(
+            limits=httpx.Limits(
+                max_connections=MAX_CONNECTIONS,
+                max_keepalive_connections=MAX_KEEPALIVE,
+                keepalive_expiry=KEEPALIVE_EXPIRY
+            ),
+            timeout=DEFAULT_TIMEOUT,
+            headers={"User-Agent": USER_AGENT},
+            follow_redirects=True
+        )
+        _client_loop = loop
+        _host_limits = {}
+        close_with_loop(_client.aclose)
+    return _client
+
+
+def _host_limit(url: str) -> asyncio.Semaphore:
+    host = urlsplit(url).hostname or ""
+    limit = _host_limits.get(host)
+    if limit is None:
+        limit = _host_limits[host] = asyncio.Semaphore(PER_HOST_LIMIT)
+    return limit
+
+
+async def get(url: str, **kwargs) -> httpx.Response:
+    """GET through the shared pool, capped at PER_HOST_LIMIT in-flight requests per host."""
+    client = get_client()
+    kwargs["timeout"] = deadlines.clamp(kwargs.get("timeout", DEFAULT_TIMEOUT))
+    async with _host_limit(url):
+        return await client.get(url, **kwargs)
+
+
+async def aclose():
+    global _client, _client_loop
+    if _client is not None:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
@@ -0,0 +1,249 @@
+import os
+import time
+import asyncio
+from collections import deque
+
+# Admission control for the LLM backends
+LLM_CONCURRENCY = int(os.getenv("LLM_CONCURRENCY", "2"))        # LLM calls running at once
+LLM_QUEUE_SIZE = int(os.getenv("LLM_QUEUE_SIZE", "32"))         # LLM calls allowed to wait
+CLIENT_MAX_REQUESTS = int(os.getenv("CLIENT_MAX_REQUESTS", "2"))  # In-flight chats per client
+QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", "60"))     # Max seconds one call waits
+
+# With slots shared between server workers: how often a waiting worker checks the
+# shared store, and how long a call waits before it reports a queue position
+SHARED_SLOT_POLL = 0.05
+SHARED_SLOT_GRACE = 0.1
+
+
+class QueueFull(Exception):
+    def __init__(self, retry_after: int):
+        super().__init__(f"LLM queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class QueueTimeout(Exception):
+    pass
+
+
+class Ticket:
+    def __init__(self, client_id: str):
+        self.client_id = client_id
+        self.granted = asyncio.get_running_loop().create_future()
+        self.enqueued_at = time.monotonic()
+
+
+class LLMLimiter:
+    """
+    Bounded concurrency for LLM calls with a bounded, per-client fair wait queue.
+    Waiting calls are kept in one FIFO per client and slots are handed out
+    round-robin across clients, so a client with many queued calls cannot
+    starve everyone else.
+    With `slots` (shared_state.SharedSlots) the slots are server-wide and shared
+    with the other workers' limiters: every call queues, and a background task
+    claims a shared slot for the next one in line.
+    """
+
+    def __init__(self, max_concurrent: int = LLM_CONCURRENCY, max_queue: int = LLM_QUEUE_SIZE, slots=None):
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.slots = slots
+        self.active = 0
+        self.waiting = {}           # client_id -> deque of Tickets
+        self.turns = deque()        # Round-robin order of clients with waiting tickets
+        self.avg_hold = 5.0         # EWMA of seconds a slot is held, for Retry-After
+        self.rejected = 0
+        self.held = []              # Shared slots this worker holds
+        self.claimer = None         # Task claiming shared slots while calls wait
+
+    @property
+    def queued(self) -> int:
+        return sum(len(tickets) for tickets in self.waiting.values())
+
+    def is_full(self) -> bool:
+        # With shared slots every call goes through the queue
+        return self.queued >= self.max_queue and (self.active >= self.max_concurrent or self.slots is not None)
+
+    def retry_after(self) -> int:
+        # Rough time until the queue drains by one concurrency "wave"
+        waves = (self.queued + self.max_concurrent) / max(self.max_concurrent, 1)
+        return max(1, int(waves * self.avg_hold))
+
+    def enqueue(self, client_id: str) -> Ticket:
+        ticket = Ticket(client_id)
+        if self.slots is None and self.active < self.max_concurrent and not self.turns:
+            self.active += 1
+            ticket.granted.set_result(True)
+            return ticket
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise QueueFull(self.retry_after())
+        if client_id not in self.waiting:
+            self.waiting[client_id] = deque()
+            self.turns.append(client_id)
+        self.waiting[client_id].append(ticket)
+        if self.slots is not None and self.claimer is None:
+            self.claimer = asyncio.get_running_loop().create_task(self._claim_shared_slots())
+        return ticket
+
+    def position(self, ticket: Ticket) -> int:
+        """1-based place in line under round-robin service (0 once granted)."""
+        if ticket.granted.done():
+            return 0
+        own = self.waiting.get(ticket.client_id)
+        if not own or ticket not in own:
+            return 0
+        index = own.index(ticket)
+        position = index + 1
+        ahead = True
+        for client_id in self.turns:
+            if client_id == ticket.client_id:
+                ahead = False
+                continue
+            # Clients earlier in the rotation get one extra turn before ours
+            position += min(len(self.waiting[client_id]), index + (1 if ahead else 0))
+        return position
+
+    def cancel(self, ticket: Ticket):
+        if ticket.granted.done():
+            return
+        ticket.granted.cancel()
+        own = self.waiting.get(ticket.client_id)
+        if own and ticket in own:
+            own.remove(ticket)
+            if not own:
+                del self.waiting[ticket.client_id]
+                self.turns.remove(ticket.client_id)
+
+    def release(self, held_for: float = None):
+        if held_for is not None:
+            self.avg_hold = 0.8 * self.avg_hold + 0.2 * held_for
+        self.active -= 1
+        if self.slots is not None:
+            # Back to the shared line, where the next slot goes to whichever worker is first
+            self._return_shared(self.held.pop())
+            return
+        while self.turns and self.active < self.max_concurrent:
+            self._grant_next()
+
+    def _grant_next(self):
+        client_id = self.turns.popleft()
+        own = self.waiting[client_id]
+        ticket = own.popleft()
+        if own:
+            self.turns.append(client_id)
+        else:
+            del self.waiting[client_id]
+        self.active += 1
+        ticket.granted.set_result(True)
+
+    def _return_shared(self, request_id: int):
+        asyncio.get_running_loop().run_in_executor(None, self.slots.release, request_id)
+
+    async def _claim_shared_slots(self):
+        # One request in the shared line at a time, for the next of this worker's waiting calls
+        request_id = None
+        try:
+            while self.turns:
+                request_id, granted = await asyncio.to_thread(self.slots.claim, request_id)
+                if not granted:
+                    await asyncio.sleep(SHARED_SLOT_POLL)
+                    continue
+                slot, request_id = request_id, None
+                if self.turns:
+                    self.held.append(slot)
+                    self._grant_next()
+                else:
+                    self._return_shared(slot)  # The waiting calls gave up meanwhile
+        finally:
+            self.claimer = None
+            if request_id is not None:
+                self._return_shared(request_id)
+
+    def stats(self) -> dict:
+        return {"active": self.active, "queued": self.queued, "max_concurrent": self.max_concurrent,
+                "max_queue": self.max_queue, "rejected": self.rejected}
+
+
+llm_limiter = LLMLimiter()
+
+
+class SlotLease:
+    """
+    An LLM slot taken with acquire_slot(). It can be handed on, e.g. to a coalesced
+    flight that outlives the caller; release() gives the slot back once and is a no-op after.
+    """
+
+    def __init__(self, limiter: LLMLimiter = None):
+        self.limiter = limiter or llm_limiter
+        self.start = time.perf_counter()
+        self.released = False
+
+    def release(self):
+        if not self.released:
+            self.released = True
+            self.limiter.release(time.perf_counter() - self.start)
+
+
+async def acquire_slot(client_id: str, limiter: LLMLimiter = None, timeout: float = QUEUE_TIMEOUT):
+    """
+    Async generator that waits for an LLM slot, yielding 'queue' events with the
+    current position while it waits. Raises QueueFull / QueueTimeout.
+    The caller then holds a slot and gives it back with limiter.release() (or a
+    SlotLease) once its LLM call is done.
+    """
+    limiter = limiter or llm_limiter
+    ticket = limiter.enqueue(client_id or "anonymous")
+    if ticket.granted.done():
+        return
+    deadline = time.monotonic() + timeout
+    last_position = None
+    handed_over = False
+    try:
+        if limiter.slots is not None:
+            # A free shared slot takes a store round trip; not worth a position update
+            await asyncio.wait([ticket.granted], timeout=SHARED_SLOT_GRACE)
+        while True:
+            if ticket.granted.done():
+                handed_over = True
+                return
+            position = limiter.position(ticket)
+            if position != last_position:
+                yield {"type": "queue", "content": f"Waiting for a free model slot (position {position})",
+                       "position": position}
+                last_position = position
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise QueueTimeout(f"Timed out after {timeout:.0f}s waiting for a model slot")
+            try:
+                # Wake up periodically to report position changes
+                await asyncio.wait_for(asyncio.shield(ticket.granted), min(remaining, 1.0))
+            except asyncio.TimeoutError:
+                continue
+    finally:
+        if not handed_over:
+            # Abandoned while waiting (timeout, disconnect): give up the place or the slot
+            if ticket.granted.done() and not ticket.granted.cancelled():
+                limiter.release()
+            else:
+                limiter.cancel(ticket)
+
+
+class ClientTracker:
+    """Counts in-flight chat requests per client for the per-client admission cap."""
+
+    def __init__(self, max_per_client: int = CLIENT_MAX_REQUESTS):
+        self.max_per_client = max_per_client
+        self.in_flight = {}
+
+    def try_start(self, client_id: str) -> bool:
+        if self.in_flight.get(client_id, 0) >= self.max_per_client:
+            return False
+        self.in_flight[client_id] = self.in_flight.get(client_id, 0) + 1
+        return True
+
+    def finish(self, client_id: str):
+        count = self.in_flight.get(client_id, 0) - 1
+        if count <= 0:
+            self.in_flight.pop(client_id, None)
+        else:
+            self.in_flight[client_id] = count
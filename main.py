@@ -3,23 +3,466 @@ import json
 import re
 import time
 import asyncio
-from openai import AsyncOpenAI
-from prompts import system_prompt
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from prompts import system_prompt, compact_system_prompt, native_system_prompt
 from actions import available_actions
+from stream_parser import StreamParser, ToolCallAccumulator, ACTION_PATTERN
+from tool_schemas import tool_schemas
+from cache import wrap_actions, make_key
+import router
+from limiter import llm_limiter, acquire_slot, SlotLease, QueueFull, QueueTimeout, LLM_QUEUE_SIZE
+from backends import backend_pool, openai_module, total_llm_slots
+import coalesce
+import metrics
+import recorder
+import shared_state
+import context_budget
+import deadlines
+from coalesce import llm_flights, tool_flights
 
-# Ollama provides an OpenAI-compatible API at localhost:11434
-client = AsyncOpenAI(
-    base_url="http://localhost:11434/v1",
-    api_key="ollama"  # Ollama doesn't require a real API key
-)
+# Tool table used by the agent: same tools, behind the shared result cache
+tools = wrap_actions(available_actions)
 
-async def stream_agent(user_input: str):
+# Dedicated, bounded pool for legacy synchronous tools (async tools run on the loop)
+TOOL_THREADS = int(os.getenv("TOOL_THREADS", "8"))
+tool_executor = ThreadPoolExecutor(max_workers=TOOL_THREADS, thread_name_prefix="tool")
+
+async def run_tool(tool_function, params: dict):
+    """Run a tool: await coroutine tools directly, push sync ones to the tool pool."""
+    if asyncio.iscoroutinefunction(tool_function):
+        return await tool_function(**params)
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(tool_executor, functools.partial(tool_function, **params))
+
+async def call_tool(function_name: str, params: dict):
+    """Run a tool from the agent's table, sharing identical in-flight calls with COALESCE_TOOLS."""
+    tool_function = tools[function_name]
+    start = time.perf_counter()
+    outcome = "cancelled"  # Timeouts cancel the call from run_tool_calls
+    try:
+        if coalesce.COALESCE_TOOLS:
+            result = await tool_flights.call(make_key(function_name, params), lambda: run_tool(tool_function, params))
+        else:
+            result = await run_tool(tool_function, params)
+        outcome = "error" if str(result).startswith("Error") else "ok"
+        recorder.record_tool(function_name, params, result, start, time.perf_counter())
+        return result
+    except Exception:
+        outcome = "error"
+        raise
+    finally:
+        metrics.record_tool_call(function_name, start, time.perf_counter(), outcome)
+
+# Several tool calls in one turn run concurrently, bounded and with per-tool timeouts
+TOOL_CONCURRENCY = int(os.getenv("TOOL_CONCURRENCY", "4"))
+TOOL_TIMEOUT = float(os.getenv("TOOL_TIMEOUT", "20"))
+TOOL_TIMEOUTS = {"calculate": 5.0, "get_weather": 12.0, "get_response_time": 25.0}
+
+async def run_tool_calls(calls: list):
+    """
+    Run (function_name, params) pairs concurrently, at most TOOL_CONCURRENCY at a time.
+    Yields (index, result, elapsed_seconds) as each call completes. Failures and
+    timeouts come back as "Error..." strings, like a tool's own errors.
+    """
+    semaphore = asyncio.Semaphore(TOOL_CONCURRENCY)
+
+    async def run_one(index, function_name, function_params):
+        async with semaphore:
+            start = time.perf_counter()
+            if function_name not in tools:
+                return index, f"Error: Tool '{function_name}' not found.", 0.0
+            # A tool never gets more time than the request has left
+            timeout = deadlines.clamp(TOOL_TIMEOUTS.get(function_name, TOOL_TIMEOUT))
+            if timeout <= 0:
+                return index, f"Error: {function_name} skipped, the request deadline has passed", 0.0
+            try:
+                result = await asyncio.wait_for(call_tool(function_name, function_params), timeout)
+            except asyncio.TimeoutError:
+                result = f"Error: {function_name} timed out after {timeout:.1f}s"
+            except Exception as e:
+                result = f"Error executing tool: {e}"
+            return index, result, time.perf_counter() - start
+
+    tasks = [asyncio.create_task(run_one(index, name, params)) for index, (name, params) in enumerate(calls)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        for task in tasks:
+            task.cancel()
+
+def format_observation(calls: list, results: list) -> str:
+    # A single call keeps the plain "Observation: <result>" shape the prompt teaches
+    if len(calls) == 1:
+        return str(results[0])
+    lines = []
+    for index, ((function_name, function_params), result) in enumerate(zip(calls, results), 1):
+        args = ", ".join(f"{key}={value!r}" for key, value in function_params.items())
+        lines.append(f"[{index}] {function_name}({args}): {result}")
+    return "\n".join(lines)
+
+# Ollama provides an OpenAI-compatible API (localhost:11434 by default). The pool
+# spreads calls over every endpoint in LLM_ENDPOINTS, with failover between them.
+client = backend_pool
+
+# Server workers (serve.py sets WEB_WORKERS) share the backends: their limiters
+# count the server-wide LLM slots together in the shared store, and each worker
+# queues its part of LLM_QUEUE_SIZE.
+WEB_WORKERS = int(os.getenv("WEB_WORKERS", "1"))
+llm_limiter.max_concurrent = total_llm_slots(len(backend_pool.backends))
+llm_limiter.max_queue = max(1, LLM_QUEUE_SIZE // WEB_WORKERS)
+if WEB_WORKERS > 1 and shared_state.store is not None:
+    llm_limiter.slots = shared_state.SharedSlots(shared_state.store, llm_limiter.max_concurrent)
+
+# Stream tokens from Ollama (answer_delta events + early stop at PAUSE).
+# Set AGENT_STREAM=0 to fall back to one blocking completion per turn.
+STREAM_TOKENS = os.getenv("AGENT_STREAM", "1") != "0"
+
+def llm_chunks(request: dict, lease: SlotLease = None):
+    """
+    Async generator over streamed completion chunks for `request`. With COALESCE_LLM,
+    identical in-flight requests share one Ollama stream. Closing the generator
+    closes the HTTP stream, which stops decoding on the server.
+    `lease` is the caller's LLM slot, released once the stream is done. A shared
+    stream keeps it until its producer ends, even if the caller that started it
+    has gone; a caller joining a running stream gives it back at once.
+    """
+    async def chunks():
+        start = time.perf_counter()
+        first_token = None
+        usage = None
+        count = 0
+        outcome = "error"
+        # Reply text and tool calls are only reassembled when this request is being recorded
+        recording = recorder.current_recording.get() is not None
+        content = []
+        tool_calls = ToolCallAccumulator()
+        error = None
+        stream = None
+        try:
+            # Inside the try, so a refused connection or 4xx/5xx is counted like a mid-stream failure
+            stream = await client.chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **request
+            )
+            async for chunk in stream:
+                if chunk.usage is not None:
+                    usage = chunk.usage
+                if chunk.choices:
+                    if first_token is None:
+                        first_token = time.perf_counter()
+                    count += 1
+                    if recording:
+                        content.append(chunk.choices[0].delta.content or "")
+                        tool_calls.feed(chunk.choices[0].delta.tool_calls)
+                yield chunk
+            outcome = "ok"
+        except GeneratorExit:
+            outcome = "stopped"  # Consumer stopped early, e.g. at PAUSE
+            raise
+        except asyncio.CancelledError:
+            outcome = "cancelled"  # Deadline, client disconnect or an abandoned coalesced flight
+            raise
+        except Exception as e:
+            error = str(e)
+            raise
+        finally:
+            if stream is not None:
+                await stream.close()
+            # Usage only arrives with the last chunk; fall back to one token per chunk
+            metrics.record_llm_call(
+                start, first_token, time.perf_counter(),
+                usage.prompt_tokens if usage else None,
+                usage.completion_tokens if usage else count,
+                outcome
+            )
+            if recording:
+                recorder.record_llm(request, "".join(content), tool_calls.result(), usage,
+                                    start, first_token, time.perf_counter(), stream=True, error=error)
+            if lease is not None:
+                lease.release()
+
+    if coalesce.COALESCE_LLM:
+        return llm_flights.stream(llm_key(request, True), chunks, on_done=lease.release if lease else None)
+    return chunks()
+
+async def llm_complete(request: dict, lease: SlotLease = None):
+    """One blocking completion; `lease` is handled as in llm_chunks."""
+    async def complete():
+        start = time.perf_counter()
+        try:
+            response = await client.chat.completions.create(**request)
+        except asyncio.CancelledError:
+            metrics.record_llm_call(start, None, time.perf_counter(), outcome="cancelled")
+            raise
+        except Exception as e:
+            metrics.record_llm_call(start, None, time.perf_counter(), outcome="error")
+            recorder.record_llm(request, None, [], None, start, None, time.perf_counter(), stream=False, error=str(e))
+            raise
+        finally:
+            if lease is not None:
+                lease.release()
+        usage = response.usage
+        # A blocking call can't separate prefill from decode; it is all reported as prefill
+        end = time.perf_counter()
+        metrics.record_llm_call(start, end, end, usage.prompt_tokens if usage else None,
+                                usage.completion_tokens if usage else None)
+        message = response.choices[0].message
+        recorder.record_llm(request, message.content, [
+            {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+            for call in (message.tool_calls or [])
+        ], usage, start, end, end, stream=False)
+        return response
+
+    if coalesce.COALESCE_LLM:
+        return await llm_flights.call(llm_key(request, False), complete, on_done=lease.release if lease else None)
+    return await complete()
+
+def llm_key(request: dict, stream: bool) -> str:
+    return coalesce.request_key({**request, "stream": stream})
+
+def joins_llm_flight(request: dict) -> bool:
+    # A coalesced follower rides on the flight's slot instead of taking its own
+    return coalesce.COALESCE_LLM and llm_flights.in_flight(llm_key(request, STREAM_TOKENS))
+
+# "text": Action/PAUSE protocol parsed from the reply (works with any model).
+# "native": OpenAI-compatible `tools` parameter + structured tool_calls; falls back
+# to the text protocol if the backend rejects tools.
+AGENT_MODE = os.getenv("AGENT_MODE", "text")
+
+# "full" (default) or "compact": a shorter text-protocol system prompt. Chosen once
+# at startup so every request starts with the same bytes (Ollama prompt cache).
+AGENT_PROMPT = os.getenv("AGENT_PROMPT", "full")
+SYSTEM_PROMPT = compact_system_prompt if AGENT_PROMPT == "compact" else system_prompt
+
+# JSON schemas for the `tools` parameter, derived from the tool signatures/docstrings
+TOOL_SCHEMAS = tool_schemas(tools)
+
+class ToolCallingUnsupported(Exception):
+    pass
+
+async def native_agent(user_input: str, max_turns: int = 5, client_id: str = None):
+    """
+    Agent loop using native function calling. Yields the same events as stream_agent.
+    Raises ToolCallingUnsupported (before yielding any answer) if the backend refuses `tools`.
+    """
+    messages = [
+        {"role": "system", "content": native_system_prompt},
+        {"role": "user", "content": user_input}
+    ]
+    previous_actions = {}
+    turn_count = 0
+
+    while turn_count < max_turns:
+        turn_count += 1
+        metrics.record_turn()
+        content = ""
+        calls = ToolCallAccumulator()
+        streamed = None  # Answer characters already sent as deltas (-1 = not streaming)
+        answer_started = False
+
+        request = {"model": "mistral", "messages": context_budget.fit_budget(messages), "tools": TOOL_SCHEMAS,
+                   "temperature": 0}
+        lease = None
+        if not joins_llm_flight(request):
+            try:
+                async for event in acquire_slot(client_id):
+                    yield event
+            except (QueueFull, QueueTimeout) as e:
+                yield {"type": "error", "content": f"Server busy: {e}"}
+                return
+            # Handed to the LLM call, which releases it when the call (or its shared flight) ends
+            lease = SlotLease()
+
+        try:
+            if STREAM_TOKENS:
+                chunks = llm_chunks(request, lease)
+                try:
+                    async for chunk in chunks:
+                        if not chunk.choices:
+                            continue
+                        delta = chunk.choices[0].delta
+                        calls.feed(delta.tool_calls)
+                        if delta.content:
+                            content += delta.content
+                            # Plain content with no tool call is the answer. Hold back the
+                            # first few characters to catch models writing the text protocol.
+                            head = content.lstrip()
+                            if streamed is None and len(head) >= len("Thought:"):
+                                if head.startswith(("Thought", "Action")):
+                                    streamed = -1
+                                else:
+                                    # Deltas carry only the answer text, like the final answer event
+                                    streamed = len(content) - len(head)
+                                    if head.startswith("Answer:"):
+                                        streamed += len("Answer:")
+                            if streamed is not None and streamed >= 0 and not calls.calls:
+                                piece = content[streamed:] if answer_started else content[streamed:].lstrip()
+                                if piece:
+                                    yield {"type": "answer_delta", "content": piece}
+                                    answer_started = True
+                                streamed = len(content)
+                finally:
+                    await chunks.aclose()
+                tool_calls = calls.result()
+            else:
+                response = await llm_complete(request, lease)
+                message = response.choices[0].message
+                content = message.content or ""
+                tool_calls = [
+                    {"id": call.id, "name": call.function.name, "arguments": call.function.arguments}
+                    for call in (message.tool_calls or [])
+                ]
+        except Exception as e:
+            if lease is not None:
+                lease.release()  # In case the call failed before it took the lease over
+            # A 400 on the first turn means the server or model rejects `tools`
+            if turn_count == 1 and isinstance(e, openai_module().BadRequestError):
+                raise ToolCallingUnsupported(str(e))
+            yield {"type": "error", "content": f"API Error: {e}"}
+            return
+
+        # Some models still write the text protocol; accept it as regular calls
+        if not tool_calls:
+            match = ACTION_PATTERN.search(content)
+            if match:
+                try:
+                    action_data = json.loads(match.group(1))
+                    action_list = action_data if isinstance(action_data, list) else [action_data]
+                    tool_calls = [{
+                        "id": None,
+                        "name": action.get("function_name"),
+                        "arguments": json.dumps(action.get("function_params", {}))
+                    } for action in action_list]
+                    content = ""
+                except json.JSONDecodeError:
+                    pass
+
+        if not tool_calls:
+            final_content = content.split("Answer:", 1)[1].strip() if "Answer:" in content else content.strip()
+            yield {"type": "answer", "content": final_content}
+            return
+
+        for index, call in enumerate(tool_calls):
+            call["id"] = call["id"] or f"call_{turn_count}_{index}"
+
+        messages.append({
+            "role": "assistant",
+            "content": "" if context_budget.DROP_THOUGHTS else content,
+            "tool_calls": [
+                {"id": call["id"], "type": "function",
+                 "function": {"name": call["name"], "arguments": call["arguments"] or "{}"}}
+                for call in tool_calls
+            ]
+        })
+
+        calls = []
+        results = [None] * len(tool_calls)
+        pending = []
+        for index, call in enumerate(tool_calls):
+            try:
+                function_params = json.loads(call["arguments"] or "{}")
+            except json.JSONDecodeError:
+                calls.append((call["name"], {}))
+                results[index] = "Error: Tool arguments were not valid JSON. Please provide an Answer."
+                continue
+            calls.append((call["name"], function_params))
+            action_key = json.dumps({"function_name": call["name"], "function_params": function_params}, sort_keys=True)
+            if action_key in previous_actions:
+                results[index] = previous_actions[action_key]
+            else:
+                pending.append(index)
+
+        if not pending and all(result is not None and not result.startswith("Error") for result in results):
+            metrics.DUPLICATE_HITS.inc()
+            yield {"type": "thought", "content": "Duplicate tool call detected. Using cached result to answer."}
+            yield {"type": "answer", "content": "\n\n".join(results)}
+            return
+
+        for index in pending:
+            yield {"type": "tool", "content": f"Running {calls[index][0]}..."}
+
+        async for index, result, elapsed in run_tool_calls([calls[i] for i in pending]):
+            results[pending[index]] = result
+            yield {"type": "tool", "content": f"{calls[pending[index]][0]} finished in {elapsed:.2f}s",
+                   "tool": calls[pending[index]][0], "index": pending[index]}
+
+        # Same deterministic stop as the text protocol
+        if all(name in ("web_search", "get_weather") for name, _ in calls) and \
+                not any(str(result).startswith("Error") for result in results):
+            yield {"type": "thought", "content": f"Got result. Answering immediately."}
+            yield {"type": "answer", "content": "\n\n".join(str(result) for result in results)}
+            return
+
+        for call, (function_name, function_params), result in zip(tool_calls, calls, results):
+            action_key = json.dumps({"function_name": function_name, "function_params": function_params}, sort_keys=True)
+            previous_actions[action_key] = str(result)[:500]
+            messages.append({"role": "tool", "tool_call_id": call["id"],
+                             "content": context_budget.compact_observation(result)})
+            yield {"type": "thought", "content": f"Observed: {str(result)[:200]}..."}
+
+    metrics.MAX_TURN_EXITS.inc()
+    yield {"type": "error", "content": "Max turns reached without final answer."}
+
+async def stream_agent(user_input: str, use_router: bool = None, mode: str = None, client_id: str = None,
+                       include_timing: bool = None, deadline: float = None):
     """
     Generator that yields events from the agent.
-    Events are certain types: 'thought', 'tool', 'answer', 'error', 'info'.
+    Events are certain types: 'thought', 'tool', 'answer', 'answer_delta', 'error', 'info', 'route'.
+    'answer_delta' carries incremental answer text while streaming; the full text
+    still arrives afterwards in a single 'answer' event.
+    'route' tells the client whether the fast path ("fast_path") or the LLM loop ("agent") ran.
+    'queue' reports the position while waiting for an LLM slot; client_id is used for
+    per-client fairness in that queue.
+    'timeout' ends the stream when the request runs past its deadline (seconds,
+    default REQUEST_DEADLINE); in-flight LLM and tool work is cancelled.
+    'timing' (last, only with include_timing / TRACE_TIMING_EVENT=1) summarizes where the time went.
     """
+    if include_timing is None:
+        include_timing = metrics.TIMING_EVENT
+    if deadline is None:
+        deadline = deadlines.REQUEST_DEADLINE
+    trace = metrics.start_trace(user_input)
+    # With RECORD_FILE set, LLM and tool I/O for this request is captured for replay
+    recording = recorder.start(user_input, use_router=router.ROUTER_ENABLED if use_router is None else use_router,
+                               mode=mode or AGENT_MODE, client_id=client_id)
+    deadlines.start(deadline)
+    events = _agent_events(user_input, use_router, mode, client_id)
+    try:
+        while True:
+            left = deadlines.remaining()
+            try:
+                if left is None:
+                    event = await events.__anext__()
+                else:
+                    # Cancelling the step unwinds the loop: the LLM stream is closed
+                    # (Ollama stops decoding), tool tasks are cancelled, the slot is released
+                    event = await asyncio.wait_for(events.__anext__(), left)
+            except StopAsyncIteration:
+                break
+            except asyncio.TimeoutError:
+                event = {"type": "timeout", "content": f"Request exceeded its {deadline:g}s deadline."}
+            trace.observe_event(event)
+            if recording is not None:
+                recording.events.append(event)
+            yield event
+            if event["type"] == "timeout":
+                break
+    finally:
+        await events.aclose()
+        deadlines.clear()
+        metrics.finish_trace(trace)
+        recorder.finish(recording)
+    if include_timing:
+        yield {"type": "timing", "content": trace.summary()}
+
+async def _agent_events(user_input: str, use_router: bool = None, mode: str = None, client_id: str = None):
+    if use_router is None:
+        use_router = router.ROUTER_ENABLED
+    if mode is None:
+        mode = AGENT_MODE
     messages = [
-        {"role": "system", "content": system_prompt},
+        {"role": "system", "content": SYSTEM_PROMPT},
         {"role": "user", "content": user_input}
     ]
 
@@ -30,6 +473,29 @@ async def stream_agent(user_input: str):
 
     yield {"type": "thought", "content": "Thinking..."}
 
+    # FAST PATH: obvious tool questions ("2 * 3.5", "weather in Paris") skip the LLM
+    route = router.route(user_input) if use_router else None
+    if route and route.function_name in tools:
+        yield {"type": "route", "content": "fast_path", "tool": route.function_name, "rule": route.rule}
+        yield {"type": "tool", "content": f"Running {route.function_name}..."}
+        # Same per-tool timeouts and error handling as the agent's tool calls
+        async for _, action_result, _ in run_tool_calls([(route.function_name, route.params)]):
+            pass
+        if not str(action_result).startswith("Error"):
+            yield {"type": "answer", "content": route.format_answer(action_result)}
+            return
+        yield {"type": "thought", "content": "Fast path tool failed, handing over to the agent."}
+
+    yield {"type": "route", "content": "agent"}
+
+    if mode == "native":
+        try:
+            async for event in native_agent(user_input, max_turns, client_id):
+                yield event
+            return
+        except ToolCallingUnsupported as e:
+            yield {"type": "thought", "content": f"Native tool calling unavailable ({e}). Using text protocol."}
+
     previous_actions = {} # Map action_str -> result
     first_tool_result = None  # Track first tool result for duplicate fallback
     seen_results = set() # Set of result strings to detect semantic loops
@@ -37,29 +503,56 @@ async def stream_agent(user_input: str):
 
     while turn_count < max_turns:
         turn_count += 1
+        metrics.record_turn()
         
+        # History is append-only and compacted as it grows, so each turn's prompt extends the last one
+        request = {"model": "mistral", "messages": context_budget.fit_budget(messages), "temperature": 0,
+                   "stop": ["Observation:"]}  # local Ollama model
+        lease = None
+        if not joins_llm_flight(request):
+            try:
+                async for event in acquire_slot(client_id):
+                    yield event
+            except (QueueFull, QueueTimeout) as e:
+                yield {"type": "error", "content": f"Server busy: {e}"}
+                return
+            # Handed to the LLM call, which releases it when the call (or its shared flight) ends
+            lease = SlotLease()
+
         try:
-            response = await client.chat.completions.create(
-                model="mistral",  # local Ollama model
-                messages=messages,
-                temperature=0,
-                stop=["Observation:"]
-            )
+            if STREAM_TOKENS:
+                parser = StreamParser()
+                chunks = llm_chunks(request, lease)
+                try:
+                    async for chunk in chunks:
+                        if not chunk.choices:
+                            continue
+                        for piece in parser.feed(chunk.choices[0].delta.content or ""):
+                            yield {"type": "answer_delta", "content": piece}
+                        if parser.action_complete:
+                            # Full Action block received - stop decoding instead of
+                            # waiting for the model to finish the turn
+                            break
+                finally:
+                    await chunks.aclose()
+                result_text = parser.text
+            else:
+                response = await llm_complete(request, lease)
+                result_text = response.choices[0].message.content
         except Exception as e:
+            if lease is not None:
+                lease.release()  # In case the call failed before it took the lease over
             yield {"type": "error", "content": f"API Error: {e}"}
             return
-
-        result_text = response.choices[0].message.content
         
         # Add the model's reply to history
-        messages.append({"role": "assistant", "content": result_text})
+        messages.append({"role": "assistant", "content": context_budget.compact_reply(result_text)})
 
         # Check if the model wants to run an action
         if "Action:" in result_text and "PAUSE" in result_text:
             
-            # Parse the action
-            action_pattern = r'Action:\s*(\{.*?\})\s*PAUSE'
-            match = re.search(action_pattern, result_text, re.DOTALL)
+            # Parse the action (a single JSON object, or a JSON list of them)
+            match = ACTION_PATTERN.search(result_text)
             
             if match:
                 consecutive_failures = 0  # Reset failure counter
@@ -67,47 +560,52 @@ async def stream_agent(user_input: str):
                 try:
                     # Normalize JSON for deduplication (ignore whitespace differences)
                     action_data = json.loads(json_str)
-                    action_key = json.dumps(action_data, sort_keys=True)
+                    action_list = action_data if isinstance(action_data, list) else [action_data]
+                    action_keys = [json.dumps(action, sort_keys=True) for action in action_list]
                     
                     # Deduplication check
-                    if action_key in previous_actions:
+                    if all(key in previous_actions for key in action_keys):
                         # Force the model to answer instead of repeating - hard stop
                         # Use first_tool_result (most likely matches original query) if available
-                        cached_result = previous_actions[action_key]
+                        cached_result = previous_actions[action_keys[0]]
                         answer_result = first_tool_result if first_tool_result else cached_result
+                        metrics.DUPLICATE_HITS.inc()
                         yield {"type": "thought", "content": "Duplicate tool call detected. Using cached result to answer."}
                         yield {"type": "answer", "content": answer_result}
                         return
                     else:
-                        # Will be populated after execution
-                        # We temporarily add it with a placeholder or wait until after execution
-                        # Better to add it after we get the result, but to be safe against self-loops in same turn (unlikely), 
-                        # we can add it now. But we need the result.
-                        # unique key for the set was fine, but map needs value.
-                        pass # wait to store until we have result
-                        action_data = json.loads(json_str)
-                        function_name = action_data.get("function_name")
-                        function_params = action_data.get("function_params", {})
+                        calls = [(action.get("function_name"), action.get("function_params", {})) for action in action_list]
+                        results = [None] * len(calls)
                         
-                        yield {"type": "tool", "content": f"Running {function_name}..."}
+                        # Calls already made this request reuse their result, the rest run concurrently
+                        pending = []
+                        for index, key in enumerate(action_keys):
+                            if key in previous_actions:
+                                results[index] = previous_actions[key]
+                            else:
+                                pending.append(index)
                         
-                        if function_name in available_actions:
-                            # Execute the function
-                            tool_function = available_actions[function_name]
-                            # Run synchronous tools in a separate thread to prevent blocking
-                            action_result = await asyncio.to_thread(tool_function, **function_params)
-                        else:
-                            action_result = f"Error: Tool '{function_name}' not found."
+                        for index in pending:
+                            yield {"type": "tool", "content": f"Running {calls[index][0]}..."}
                         
-                        # DETERMINISTIC STOPPING: Force answer after first successful info-retrieval tool
+                        async for index, result, elapsed in run_tool_calls([calls[i] for i in pending]):
+                            results[pending[index]] = result
+                            yield {"type": "tool", "content": f"{calls[pending[index]][0]} finished in {elapsed:.2f}s",
+                                   "tool": calls[pending[index]][0], "index": pending[index]}
+                        
+                        # DETERMINISTIC STOPPING: Force answer after successful info-retrieval tools
                         # Don't rely on LLM to decide when to stop - enforce it programmatically
-                        if function_name in ("web_search", "get_weather") and not action_result.startswith("Error"):
+                        if all(name in ("web_search", "get_weather") for name, _ in calls) and \
+                                not any(str(result).startswith("Error") for result in results):
                             yield {"type": "thought", "content": f"Got result. Answering immediately."}
-                            yield {"type": "answer", "content": action_result}
+                            yield {"type": "answer", "content": "\n\n".join(str(result) for result in results)}
                             return
                         
                         # Store result for deduplication (for tools that don't force-stop)
-                        previous_actions[action_key] = str(action_result)[:500]
+                        for key, result in zip(action_keys, results):
+                            previous_actions[key] = str(result)[:500]
+                        
+                        action_result = context_budget.compact_observation(format_observation(calls, results))
                         
                         # Track first tool result for fallback
                         if first_tool_result is None:
@@ -122,6 +620,7 @@ async def stream_agent(user_input: str):
 
                 except json.JSONDecodeError:
                     action_result = "Error: Failed to decode Action JSON. Please provide an Answer."
+                    metrics.PARSE_FAILURES.inc()
                 except Exception as e:
                     action_result = f"Error executing tool: {e}"
                 
@@ -135,6 +634,7 @@ async def stream_agent(user_input: str):
             else:
                 # Pattern didn't match - could be malformed, force an answer
                 consecutive_failures += 1
+                metrics.PARSE_FAILURES.inc()
                 if consecutive_failures >= 2:
                     yield {"type": "error", "content": "Multiple parsing failures. Stopping."}
                     return
@@ -157,6 +657,7 @@ async def stream_agent(user_input: str):
             return
         
     if turn_count >= max_turns:
+        metrics.MAX_TURN_EXITS.inc()
         yield {"type": "error", "content": "Max turns reached without final answer."}
 
 async def run_agent_async(user_input: str):
@@ -0,0 +1,310 @@
+import os
+import json
+import time
+import uuid
+import threading
+import contextvars
+
+# Per-request traces can be appended to a JSONL file for offline analysis
+TRACE_FILE = os.getenv("TRACE_FILE")
+# Attach a 'timing' summary event at the end of every stream_agent run
+TIMING_EVENT = os.getenv("TRACE_TIMING_EVENT", "0") == "1"
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 8, 10)
+TOKEN_BUCKETS = (16, 64, 256, 512, 1024, 2048, 4096, 8192)
+
+
+# --- Prometheus text exposition ---------------------------------------------
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _label_str(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.labels = labels
+        self.values = {}
+        self.lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            self.values[key] = self.values.get(key, 0) + amount
+
+    def snapshot(self) -> list:
+        with self.lock:
+            return [[list(key), value] for key, value in self.values.items()]
+
+    def merge(self, snapshots: dict) -> dict:
+        values = {}
+        for snapshot in snapshots.values():
+            for key, value in snapshot.get(self.name, []):
+                values[tuple(key)] = values.get(tuple(key), 0) + value
+        return values
+
+    def render(self, values: dict = None) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self.lock:
+            values = dict(self.values) if values is None else values
+        for key, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_str(self.labels, key)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, buckets: tuple = LATENCY_BUCKETS, labels: tuple = ()):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.labels = labels
+        self.series = {}   # label values -> [bucket counts..., sum, count]
+        self.lock = threading.Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(labels.get(name, "") for name in self.labels)
+        with self.lock:
+            series = self.series.setdefault(key, [0] * len(self.buckets) + [0.0, 0])
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def snapshot(self) -> list:
+        with self.lock:
+            return [[list(key), list(series)] for key, series in self.series.items()]
+
+    def merge(self, snapshots: dict) -> dict:
+        merged = {}
+        for snapshot in snapshots.values():
+            for key, series in snapshot.get(self.name, []):
+                total = merged.setdefault(tuple(key), [0] * len(series))
+                for index, value in enumerate(series):
+                    total[index] += value
+        return merged
+
+    def render(self, merged: dict = None) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self.lock:
+            merged = {key: list(series) for key, series in self.series.items()} if merged is None else merged
+        for key, series in sorted(merged.items()):
+            for bound, count in zip(self.buckets, series):
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_label_str(self.labels, key, le)} {count}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_label_str(self.labels, key, inf)} {series[-1]}")
+            lines.append(f"{self.name}_sum{_label_str(self.labels, key)} {series[-2]}")
+            lines.append(f"{self.name}_count{_label_str(self.labels, key)} {series[-1]}")
+        return lines
+
+
+class Gauge:
+    """A gauge read from a callback at scrape time (e.g. limiter queue length)."""
+
+    def __init__(self, name: str, help_text: str, read):
+        self.name = name
+        self.help = help_text
+        self.read = read
+
+    def snapshot(self):
+        return self.read()
+
+    def merge(self, snapshots: dict) -> dict:
+        # Gauges are not summed: each worker's value is reported under its own label
+        return {worker: snapshot[self.name] for worker, snapshot in snapshots.items() if self.name in snapshot}
+
+    def render(self, values: dict = None) -> list:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} gauge"]
+        if values is None:
+            return lines + [f"{self.name} {self.read()}"]
+        for worker, value in sorted(values.items()):
+            lines.append(f"{self.name}{_label_str(('worker',), (worker,))} {value}")
+        return lines
+
+
+registry = []
+
+
+def register(metric):
+    registry.append(metric)
+    return metric
+
+
+def render() -> str:
+    lines = []
+    for metric in registry:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+def snapshot() -> dict:
+    """This process's metric values as plain JSON data, for merging across server workers."""
+    return {metric.name: metric.snapshot() for metric in registry}
+
+
+def render_merged(snapshots: dict, live: set) -> str:
+    """
+    Render {worker: snapshot} as one exposition: counters and histograms are
+    summed over every worker (exited ones included, so totals never go back),
+    gauges are reported per worker for the `live` ones only.
+    """
+    lines = []
+    for metric in registry:
+        if isinstance(metric, Gauge):
+            lines.extend(metric.render(metric.merge({w: s for w, s in snapshots.items() if w in live})))
+        else:
+            lines.extend(metric.render(metric.merge(snapshots)))
+    return "\n".join(lines) + "\n"
+
+
+REQUESTS = register(Counter("agent_requests_total", "Agent requests by path and outcome", ("path", "outcome")))
+REQUEST_SECONDS = register(Histogram("agent_request_seconds", "End-to-end stream_agent duration", labels=("path",)))
+FIRST_ANSWER_SECONDS = register(Histogram("agent_first_answer_seconds", "Time to the first answer token"))
+TURNS = register(Histogram("agent_turns", "LLM turns per request", COUNT_BUCKETS))
+LLM_CALLS = register(Counter("llm_calls_total", "LLM requests by outcome", ("outcome",)))
+LLM_PREFILL_SECONDS = register(Histogram("llm_prefill_seconds", "Time to first token of an LLM call"))
+LLM_DECODE_SECONDS = register(Histogram("llm_decode_seconds", "First token to end of an LLM call"))
+LLM_PROMPT_TOKENS = register(Histogram("llm_prompt_tokens", "Prompt tokens per LLM call", TOKEN_BUCKETS))
+LLM_COMPLETION_TOKENS = register(Histogram("llm_completion_tokens", "Completion tokens per LLM call", TOKEN_BUCKETS))
+TOOL_CALLS = register(Counter("tool_calls_total", "Tool calls by tool and outcome", ("tool", "outcome")))
+TOOL_SECONDS = register(Histogram("tool_seconds", "Tool call duration", labels=("tool",)))
+DUPLICATE_HITS = register(Counter("agent_duplicate_actions_total", "Repeated tool calls answered from the dedup map"))
+PARSE_FAILURES = register(Counter("agent_parse_failures_total", "Replies with an unparseable Action block"))
+MAX_TURN_EXITS = register(Counter("agent_max_turns_total", "Requests that hit max_turns without an answer"))
+DISCONNECTS = register(Counter("agent_client_disconnects_total", "Requests cancelled because the client went away"))
+
+
+def percentile(values: list, p: float) -> float:
+    """p-th percentile (0-100), interpolating linearly between the two nearest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = (len(ordered) - 1) * p / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+# --- Traces ------------------------------------------------------------------
+
+current_trace = contextvars.ContextVar("current_trace", default=None)
+_trace_file_lock = threading.Lock()
+
+
+class Trace:
+    """Spans for one stream_agent request: turns, LLM calls and tool calls."""
+
+    def __init__(self, question: str):
+        self.request_id = uuid.uuid4().hex[:12]
+        self.question = question
+        self.start = time.perf_counter()
+        self.started_at = time.time()
+        self.end = None
+        self.spans = []
+        self.turns = 0
+        self.path = None
+        self.outcome = None
+        self.first_answer = None
+
+    def elapsed(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def add_span(self, name: str, start: float, end: float, **attrs):
+        self.spans.append({"name": name, "start_ms": round(1000 * (start - self.start), 2),
+                           "duration_ms": round(1000 * (end - start), 2), **attrs})
+
+    def observe_event(self, event: dict):
+        etype = event.get("type")
+        if etype == "route":
+            self.path = event.get("content")
+        elif etype in ("answer", "answer_delta"):
+            if self.first_answer is None:
+                self.first_answer = self.elapsed()
+            if etype == "answer":
+                self.outcome = "answer"
+        elif etype == "error" and self.outcome is None:
+            self.outcome = "error"
+        elif etype == "timeout":
+            self.outcome = "timeout"
+
+    def summary(self) -> dict:
+        totals = {}
+        for span in self.spans:
+            totals[span["name"]] = round(totals.get(span["name"], 0) + span["duration_ms"], 2)
+        return {
+            "request_id": self.request_id,
+            "total_ms": round(1000 * self.elapsed(), 2),
+            "first_answer_ms": round(1000 * self.first_answer, 2) if self.first_answer is not None else None,
+            "turns": self.turns,
+            "path": self.path,
+            "span_ms": totals,
+            "prompt_tokens": sum(span.get("prompt_tokens") or 0 for span in self.spans),
+            "completion_tokens": sum(span.get("completion_tokens") or 0 for span in self.spans),
+        }
+
+    def to_dict(self) -> dict:
+        return {"request_id": self.request_id, "started_at": self.started_at, "question": self.question,
+                "outcome": self.outcome, **self.summary(), "spans": self.spans}
+
+
+def start_trace(question: str) -> Trace:
+    trace = Trace(question)
+    current_trace.set(trace)
+    return trace
+
+
+def finish_trace(trace: Trace):
+    trace.end = time.perf_counter()
+    path = trace.path or "none"
+    outcome = trace.outcome or "cancelled"
+    REQUESTS.inc(path=path, outcome=outcome)
+    REQUEST_SECONDS.observe(trace.elapsed(), path=path)
+    if trace.first_answer is not None:
+        FIRST_ANSWER_SECONDS.observe(trace.first_answer)
+    if trace.turns:
+        TURNS.observe(trace.turns)
+    if TRACE_FILE:
+        line = json.dumps(trace.to_dict())
+        with _trace_file_lock:
+            with open(TRACE_FILE, "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+
+
+def record_llm_call(start: float, first_token: float, end: float, prompt_tokens: int = None,
+                    completion_tokens: int = None, outcome: str = "ok"):
+    LLM_CALLS.inc(outcome=outcome)
+    first_token = first_token or end
+    LLM_PREFILL_SECONDS.observe(first_token - start)
+    LLM_DECODE_SECONDS.observe(end - first_token)
+    if prompt_tokens is not None:
+        LLM_PROMPT_TOKENS.observe(prompt_tokens)
+    if completion_tokens is not None:
+        LLM_COMPLETION_TOKENS.observe(completion_tokens)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span("llm", start, end, prefill_ms=round(1000 * (first_token - start), 2),
+                       prompt_tokens=prompt_tokens, completion_tokens=completion_tokens, outcome=outcome)
+
+
+def record_tool_call(tool: str, start: float, end: float, outcome: str):
+    TOOL_CALLS.inc(tool=tool, outcome=outcome)
+    TOOL_SECONDS.observe(end - start, tool=tool)
+    trace = current_trace.get()
+    if trace is not None:
+        trace.add_span("tool", start, end, tool=tool, outcome=outcome)
+
+
+def record_turn():
+    trace = current_trace.get()
+    if trace is not None:
+        trace.turns += 1
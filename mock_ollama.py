@@ -0,0 +1,122 @@
+# Stand-in for Ollama's OpenAI-compatible API, for offline benchmarks.
+#
+# Replies are scripted: the first rule whose `match` appears in the latest user
+# message (case-insensitive) wins. Tokens are streamed with a configurable delay
+# and time-to-first-token, and `stop` sequences are honoured like Ollama does.
+#
+#     python mock_ollama.py --port 11500 --token-delay 0.02 --ttft 0.3
+import re
+import json
+import time
+import asyncio
+import argparse
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse, JSONResponse
+import uvicorn
+
+# Default script: exercises direct answers, single tool calls and the Observation follow-up
+DEFAULT_RULES = [
+    {"match": "Observation:", "reply": "Thought: The observation answers the question.\nAnswer: Here is what I found based on the observation."},
+    {"match": "weather", "reply": 'Thought: I should check the weather.\nAction:\n{\n  "function_name": "get_weather",\n  "function_params": {"city": "London"}\n}\nPAUSE'},
+    {"match": "who is", "reply": 'Thought: I should search for this.\nAction:\n{\n  "function_name": "web_search",\n  "function_params": {"query": "Google CEO"}\n}\nPAUSE'},
+    {"match": "response time", "reply": 'Thought: I should measure it.\nAction:\n{\n  "function_name": "get_response_time",\n  "function_params": {"url": "example.com"}\n}\nPAUSE'},
+    {"match": "", "reply": "Thought: I know this.\nAnswer: " + " ".join(["This is a direct answer generated by the mock model."] * 4)},
+]
+
+TOKEN_PATTERN = re.compile(r"\S+\s*|\s+")
+
+
+class MockModel:
+    def __init__(self, rules: list = None, token_delay: float = 0.01, ttft: float = 0.1,
+                 prefill_per_token: float = 0.0):
+        self.rules = rules or DEFAULT_RULES
+        self.token_delay = token_delay
+        self.ttft = ttft
+        self.prefill_per_token = prefill_per_token   # Extra TTFT per prompt token (rough: 4 chars)
+        self.requests = 0
+
+    def reply_for(self, messages: list, stop: list) -> str:
+        last_user = next((m.get("content") or "" for m in reversed(messages) if m.get("role") in ("user", "tool")), "")
+        reply = ""
+        for rule in self.rules:
+            if rule["match"].lower() in last_user.lower():
+                reply = rule["reply"]
+                break
+        for marker in stop or []:
+            if marker in reply:
+                reply = reply[:reply.index(marker)]
+        return reply
+
+    def first_token_delay(self, messages: list) -> float:
+        prompt_chars = sum(len(m.get("content") or "") for m in messages)
+        return self.ttft + self.prefill_per_token * prompt_chars / 4
+
+
+def create_app(model: MockModel) -> FastAPI:
+    app = FastAPI()
+
+    @app.get("/v1/models")
+    async def models():
+        return {"object": "list", "data": [{"id": "mistral", "object": "model"}]}
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        model.requests += 1
+        messages = body.get("messages", [])
+        stop = body.get("stop")
+        if isinstance(stop, str):
+            stop = [stop]
+        reply = model.reply_for(messages, stop)
+        tokens = TOKEN_PATTERN.findall(reply)
+        created = int(time.time())
+        completion_id = f"chatcmpl-mock-{model.requests}"
+        prompt_tokens = sum(len(m.get("content") or "") for m in messages) // 4
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": len(tokens),
+                 "total_tokens": prompt_tokens + len(tokens)}
+
+        if not body.get("stream"):
+            await asyncio.sleep(model.first_token_delay(messages) + model.token_delay * len(tokens))
+            return JSONResponse({
+                "id": completion_id, "object": "chat.completion", "created": created, "model": body.get("model"),
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "stop"}],
+                "usage": usage
+            })
+
+        async def events():
+            await asyncio.sleep(model.first_token_delay(messages))
+            for index, token in enumerate(tokens):
+                if index:
+                    await asyncio.sleep(model.token_delay)
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                         "model": body.get("model"),
+                         "choices": [{"index": 0, "delta": {"role": "assistant", "content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk)}\n\n"
+            final = {"id": completion_id, "object": "chat.completion.chunk", "created": created,
+                     "model": body.get("model"),
+                     "choices": [{"index": 0, "delta": {}, "finish_reason": "stop"}], "usage": usage}
+            yield f"data: {json.dumps(final)}\n\n"
+            yield "data: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+def load_rules(path: str) -> list:
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat server")
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--token-delay", type=float, default=0.01, help="Seconds between streamed tokens")
+    parser.add_argument("--ttft", type=float, default=0.1, help="Seconds before the first token")
+    parser.add_argument("--prefill-per-token", type=float, default=0.0, help="Extra TTFT seconds per prompt token")
+    parser.add_argument("--rules", help="JSON file with [{\"match\": ..., \"reply\": ...}] rules")
+    args = parser.parse_args()
+
+    mock = MockModel(load_rules(args.rules) if args.rules else None, args.token_delay, args.ttft,
+                     args.prefill_per_token)
+    uvicorn.run(create_app(mock), host="127.0.0.1", port=args.port, log_level="warning")
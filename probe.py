@@ -0,0 +1,190 @@
+import os
+import time
+import socket
+import asyncio
+import statistics
+from urllib.parse import urlsplit
+import httpx
+import deadlines
+from metrics import percentile
+
+# Latency probe behind get_response_time: several samples per URL with a phase
+# breakdown (DNS, TCP connect, TLS, time to first byte, body transfer).
+#
+# DNS is timed with one getaddrinfo() and the request then connects to that
+# address (Host header and TLS SNI keep the name), so the connect phase does not
+# resolve again. Only the first address is tried, and a caching resolver on the
+# host (nscd, systemd-resolved) can make DNS read as near zero.
+PROBE_SAMPLES = int(os.getenv("PROBE_SAMPLES", "3"))
+PROBE_MAX_SAMPLES = int(os.getenv("PROBE_MAX_SAMPLES", "10"))
+PROBE_MAX_URLS = int(os.getenv("PROBE_MAX_URLS", "5"))
+PROBE_TIMEOUT = float(os.getenv("PROBE_TIMEOUT", "10"))   # Per request
+PROBE_BUDGET = float(os.getenv("PROBE_BUDGET", "10"))     # Per URL; fewer samples are reported if it runs out
+
+PHASES = ("dns", "connect", "tls", "ttfb", "transfer")
+
+
+class PhaseTrace:
+    """httpcore trace callback recording when each step of a request started and finished."""
+
+    def __init__(self):
+        self.marks = {}
+
+    async def __call__(self, event_name: str, info: dict):
+        # e.g. "connection.connect_tcp.started", "http11.receive_response_headers.complete"
+        self.marks.setdefault(event_name.split(".", 1)[1], time.perf_counter())
+
+    def between(self, start: str, end: str):
+        if start in self.marks and end in self.marks:
+            return self.marks[end] - self.marks[start]
+        return None
+
+
+def _new_client() -> httpx.AsyncClient:
+    return httpx.AsyncClient(timeout=deadlines.clamp(PROBE_TIMEOUT), follow_redirects=False,
+                             headers={"User-Agent": "CustomAgent-probe/1.0"})
+
+
+async def resolve(host: str, port: int) -> tuple:
+    """(first address for `host`, seconds the lookup took)."""
+    start = time.perf_counter()
+    infos = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+    return infos[0][4][0], time.perf_counter() - start
+
+
+async def sample(client: httpx.AsyncClient, url: str, method: str, address: str = None) -> dict:
+    """
+    One timed request. Without `address` the host name is resolved (and timed)
+    first; warm samples pass the set-up request's address to reuse its connection.
+    Phases that did not happen (reused connection, plain HTTP) are None.
+    """
+    parts = urlsplit(url)
+    dns = None
+    if address is None:
+        address, dns = await resolve(parts.hostname, parts.port or (443 if parts.scheme == "https" else 80))
+    target = httpx.URL(url)
+    trace = PhaseTrace()
+    extensions = {"trace": trace}
+    if parts.scheme == "https":
+        # The certificate is still checked against the name, not the address
+        extensions["sni_hostname"] = target.host
+    start = time.perf_counter()
+    response = await client.request(method, target.copy_with(host=address), headers={"Host": target.netloc.decode()},
+                                    extensions=extensions)
+    end = time.perf_counter()
+    return {
+        "total": end - start + (dns or 0.0),
+        "dns": dns,
+        "address": address,
+        "connect": trace.between("connect_tcp.started", "connect_tcp.complete"),
+        "tls": trace.between("start_tls.started", "start_tls.complete"),
+        "ttfb": trace.between("send_request_headers.started", "receive_response_headers.complete"),
+        "transfer": trace.between("receive_response_headers.complete", "receive_response_body.complete"),
+        "status": response.status_code,
+        "location": response.headers.get("location") if response.is_redirect else None,
+    }
+
+
+async def probe_url(url: str, samples: int = None, method: str = "GET", mode: str = "cold") -> dict:
+    """
+    Measure `url` `samples` times. "cold" opens a new connection for every
+    sample (DNS, connect and TLS included, like a first visit); "warm" makes one
+    request to set the connection up and then samples over the kept-alive
+    connection (time to first byte and transfer only).
+    """
+    samples = max(1, min(samples or PROBE_SAMPLES, PROBE_MAX_SAMPLES))
+    method = method.upper()
+    if not url.startswith("http"):
+        url = "https://" + url
+    budget_end = time.perf_counter() + deadlines.clamp(PROBE_BUDGET)
+    result = {"url": url, "method": method, "mode": mode, "samples": [], "first": None, "note": None}
+
+    client = _new_client()
+    try:
+        # The first request also settles redirects and servers that refuse HEAD
+        for _ in range(5):
+            first = await sample(client, url, method)
+            if first["location"]:
+                url = result["url"] = str(httpx.URL(url).join(first["location"]))
+                result["note"] = f"redirected to {url}"
+            elif method == "HEAD" and first["status"] in (405, 501):
+                method = result["method"] = "GET"
+                result["note"] = "HEAD not allowed, used GET"
+            else:
+                break
+            # Start over on a fresh connection so the first request stays a cold one
+            await client.aclose()
+            client = _new_client()
+        result["first"] = first
+        result["samples"].append(first)
+        # Warm samples come after the set-up request. The budget may cut sampling
+        # short, but never before there is at least one sample of the requested mode.
+        setup = 1 if mode == "warm" else 0
+        while len(result["samples"]) < samples + setup:
+            if len(result["samples"]) > setup and time.perf_counter() >= budget_end:
+                break
+            if mode == "cold":
+                await client.aclose()
+                client = _new_client()
+            address = None if mode == "cold" else first["address"]
+            result["samples"].append(await sample(client, url, method, address))
+    finally:
+        await client.aclose()
+
+    if mode == "warm":
+        # The set-up request is reported on its own, not mixed into warm samples
+        result["samples"] = result["samples"][1:]
+    return result
+
+
+def summarize(result: dict) -> dict:
+    totals = [s["total"] for s in result["samples"]]
+    phases = {}
+    for phase in PHASES:
+        values = [s[phase] for s in result["samples"] if s[phase] is not None]
+        if values:
+            phases[phase] = statistics.median(values)
+    return {"median": statistics.median(totals), "min": min(totals), "p95": percentile(totals, 95),
+            "count": len(totals), "phases": phases}
+
+
+def _ms(seconds: float) -> str:
+    return f"{1000 * seconds:.0f} ms"
+
+
+def _s(seconds: float) -> str:
+    # Enough digits that a fast local site does not read as "0.00"
+    return f"{seconds:.2f}" if seconds >= 0.1 else f"{seconds:.3f}"
+
+
+def describe(result: dict) -> str:
+    """One line: the median first (so it reads as "the response time is ..."), then the detail."""
+    stats = summarize(result)
+    phase_text = ", ".join(f"{name.upper() if name in ('dns', 'tls', 'ttfb') else name} {_ms(value)}"
+                           for name, value in stats["phases"].items())
+    detail = [f"median of {stats['count']} {result['mode']} {result['method']} sample{'s' if stats['count'] != 1 else ''}, "
+              f"min {_s(stats['min'])}s, p95 {_s(stats['p95'])}s"]
+    if phase_text:
+        detail.append(phase_text)
+    if result["mode"] == "warm" and result["first"] is not None:
+        detail.append(f"first request {_s(result['first']['total'])}s")
+    detail.append(f"HTTP {result['samples'][-1]['status']}")
+    if result["note"]:
+        detail.append(result["note"])
+    return f"{_s(stats['median'])} seconds ({'; '.join(detail)})"
+
+
+async def probe(urls: list, samples: int = None, method: str = "GET", mode: str = "cold") -> list:
+    """Probe several URLs concurrently; returns one line (or error) per URL, in order."""
+    if mode not in ("cold", "warm"):
+        raise ValueError("mode must be 'cold' or 'warm'")
+    if method.upper() not in ("GET", "HEAD"):
+        raise ValueError("method must be GET or HEAD")
+
+    async def one(url):
+        try:
+            return describe(await probe_url(url, samples, method, mode))
+        except Exception as e:
+            return f"Error: {type(e).__name__}: {e}" if str(e) else f"Error: {type(e).__name__}"
+
+    return await asyncio.gather(*(one(url) for url in urls[:PROBE_MAX_URLS]))
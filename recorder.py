@@ -0,0 +1,342 @@
+# Record/replay of agent traffic.
+#
+# With RECORD_FILE set, every stream_agent request is captured (messages sent to
+# the model, completions, tool calls and results, timings) as one line of a
+# gzip-compressed JSONL file. Replay feeds a recording back through stream_agent
+# with the LLM client and tools answered from the recording:
+#
+#     RECORD_FILE=traffic.jsonl.gz uvicorn server:app
+#     python recorder.py traffic.jsonl.gz --concurrency 20 --output replay.json
+#     python recorder.py traffic.jsonl.gz --timing --pace     # original latencies and arrival times
+import os
+import gzip
+import json
+import time
+import types
+import asyncio
+import argparse
+import threading
+import contextvars
+from metrics import percentile
+
+RECORD_FILE = os.getenv("RECORD_FILE")
+
+current_recording = contextvars.ContextVar("current_recording", default=None)
+_write_lock = threading.Lock()
+
+
+def llm_request_key(request: dict) -> str:
+    # Only what determines the reply: the conversation and generation params
+    relevant = {key: value for key, value in request.items() if key not in ("stream", "stream_options")}
+    return json.dumps(relevant, sort_keys=True, default=str)
+
+
+def tool_call_key(function_name: str, params: dict) -> str:
+    return json.dumps({"function_name": function_name, "function_params": params}, sort_keys=True)
+
+
+# --- Recording ---------------------------------------------------------------
+
+class Recording:
+    def __init__(self, question: str, options: dict):
+        self.question = question
+        self.options = options
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.llm_calls = []
+        self.tool_calls = []
+        self.events = []
+
+    def offset(self, moment: float) -> float:
+        return round(moment - self.start, 4)
+
+    def to_dict(self) -> dict:
+        return {
+            "question": self.question,
+            "options": self.options,
+            "started_at": self.started_at,
+            "duration": round(time.perf_counter() - self.start, 4),
+            "llm_calls": self.llm_calls,
+            "tool_calls": self.tool_calls,
+            "events": self.events,
+        }
+
+
+def start(question: str, **options):
+    if not RECORD_FILE:
+        return None
+    recording = Recording(question, options)
+    current_recording.set(recording)
+    return recording
+
+
+def record_llm(request: dict, content: str, tool_calls: list, usage, start_time: float,
+               first_token: float, end_time: float, stream: bool, error: str = None):
+    recording = current_recording.get()
+    if recording is None:
+        return
+    recording.llm_calls.append({
+        # Deep copy: the agent keeps appending to the same messages list
+        "request": json.loads(json.dumps(request, default=str)),
+        "stream": stream,
+        "content": content,
+        "tool_calls": tool_calls,
+        "usage": {"prompt_tokens": usage.prompt_tokens, "completion_tokens": usage.completion_tokens} if usage else None,
+        "start": recording.offset(start_time),
+        "ttft": round((first_token or end_time) - start_time, 4),
+        "duration": round(end_time - start_time, 4),
+        "error": error,  # The call failed; replay raises it again
+    })
+
+
+def record_tool(function_name: str, params: dict, result, start_time: float, end_time: float):
+    recording = current_recording.get()
+    if recording is None:
+        return
+    recording.tool_calls.append({
+        "function_name": function_name,
+        "params": params,
+        "result": str(result),
+        "start": recording.offset(start_time),
+        "duration": round(end_time - start_time, 4),
+    })
+
+
+def finish(recording: Recording, path: str = None):
+    path = path or RECORD_FILE
+    if recording is None or not path:
+        return
+    line = json.dumps(recording.to_dict(), default=str)
+    with _write_lock:
+        # Appending a new gzip member per line keeps the file readable as one stream
+        with gzip.open(path, "at", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+
+def load(path: str) -> list:
+    opener = gzip.open if path.endswith(".gz") else open
+    with opener(path, "rt", encoding="utf-8") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+# --- Replay ------------------------------------------------------------------
+
+current_replay = contextvars.ContextVar("current_replay", default=None)
+
+
+class ReplaySession:
+    """Recorded answers for one request. Exact request matches win, otherwise calls are served in order."""
+
+    def __init__(self, recording: dict, preserve_timing: bool):
+        self.recording = recording
+        self.preserve_timing = preserve_timing
+        self.llm_by_key = {}
+        for call in recording["llm_calls"]:
+            self.llm_by_key.setdefault(llm_request_key(call["request"]), []).append(call)
+        self.llm_in_order = list(recording["llm_calls"])
+        self.tools_by_key = {}
+        for call in recording["tool_calls"]:
+            self.tools_by_key.setdefault(tool_call_key(call["function_name"], call["params"]), []).append(call)
+        self.llm_served = 0
+        self.llm_misses = 0
+        self.tool_misses = 0
+
+    def next_llm(self, request: dict):
+        self.llm_served += 1
+        matches = self.llm_by_key.get(llm_request_key(request))
+        if matches:
+            call = matches.pop(0)
+            if call in self.llm_in_order:
+                self.llm_in_order.remove(call)
+            return call
+        # Loop logic changed the conversation - fall back to the next recorded reply
+        self.llm_misses += 1
+        if self.llm_in_order:
+            call = self.llm_in_order.pop(0)
+            for calls in self.llm_by_key.values():
+                if call in calls:
+                    calls.remove(call)
+            return call
+        return {"content": "Answer: (no recorded reply)", "tool_calls": [], "usage": None,
+                "ttft": 0.0, "duration": 0.0}
+
+    def tool_result(self, function_name: str, params: dict):
+        matches = self.tools_by_key.get(tool_call_key(function_name, params))
+        if matches:
+            return matches.pop(0) if len(matches) > 1 else matches[0]
+        self.tool_misses += 1
+        return {"result": f"Error: no recorded result for {function_name}", "duration": 0.0}
+
+
+def _chunk(content: str = None, tool_calls: list = None, usage=None, choices: bool = True):
+    delta = types.SimpleNamespace(content=content, tool_calls=tool_calls, role="assistant")
+    return types.SimpleNamespace(
+        choices=[types.SimpleNamespace(index=0, delta=delta, finish_reason=None)] if choices else [],
+        usage=usage
+    )
+
+
+def _usage(recorded):
+    if not recorded:
+        return None
+    return types.SimpleNamespace(**recorded, total_tokens=recorded["prompt_tokens"] + recorded["completion_tokens"])
+
+
+class ReplayStream:
+    def __init__(self, call: dict, preserve_timing: bool):
+        self.call = call
+        self.preserve_timing = preserve_timing
+        self.closed = False
+
+    def __aiter__(self):
+        return self._chunks()
+
+    async def _chunks(self):
+        content = self.call.get("content") or ""
+        pieces = [content[i:i + 4] for i in range(0, len(content), 4)]
+        decode = max(self.call.get("duration", 0) - self.call.get("ttft", 0), 0)
+        if self.preserve_timing:
+            await asyncio.sleep(self.call.get("ttft", 0))
+        for piece in pieces:
+            if self.closed:
+                return
+            if self.preserve_timing and pieces:
+                await asyncio.sleep(decode / len(pieces))
+            yield _chunk(piece)
+        for index, call in enumerate(self.call.get("tool_calls") or []):
+            function = types.SimpleNamespace(name=call["name"], arguments=call["arguments"])
+            yield _chunk(tool_calls=[types.SimpleNamespace(index=index, id=call.get("id"), function=function)])
+        yield _chunk(usage=_usage(self.call.get("usage")), choices=False)
+
+    async def close(self):
+        self.closed = True
+
+
+class RecordedLLMError(Exception):
+    pass
+
+
+class ReplayCompletions:
+    async def create(self, stream: bool = False, stream_options: dict = None, **request):
+        session = current_replay.get()
+        call = session.next_llm(request)
+        if call.get("error"):
+            if session.preserve_timing:
+                await asyncio.sleep(call.get("duration", 0))
+            raise RecordedLLMError(call["error"])
+        if stream:
+            return ReplayStream(call, session.preserve_timing)
+        if session.preserve_timing:
+            await asyncio.sleep(call.get("duration", 0))
+        tool_calls = [
+            types.SimpleNamespace(id=c.get("id"), type="function",
+                                  function=types.SimpleNamespace(name=c["name"], arguments=c["arguments"]))
+            for c in call.get("tool_calls") or []
+        ]
+        message = types.SimpleNamespace(role="assistant", content=call.get("content"), tool_calls=tool_calls or None)
+        return types.SimpleNamespace(choices=[types.SimpleNamespace(index=0, message=message, finish_reason="stop")],
+                                     usage=_usage(call.get("usage")))
+
+
+class ReplayClient:
+    def __init__(self):
+        self.chat = types.SimpleNamespace(completions=ReplayCompletions())
+
+
+def replay_tool(function_name: str):
+    async def tool(**params):
+        session = current_replay.get()
+        recorded = session.tool_result(function_name, params)
+        if session.preserve_timing:
+            await asyncio.sleep(recorded.get("duration", 0))
+        return recorded["result"]
+    tool.__name__ = function_name
+    return tool
+
+
+async def replay(recordings: list, preserve_timing: bool = False, pace: bool = False,
+                 concurrency: int = 10) -> list:
+    """Run recordings back through stream_agent; returns one result dict per recording."""
+    import main
+    import recorder
+
+    # Replaying must not append to a recording (possibly the one being read)
+    recorder.RECORD_FILE = None
+    main.client = ReplayClient()
+    names = set(main.tools) | {call["function_name"] for rec in recordings for call in rec["tool_calls"]}
+    main.tools.clear()
+    main.tools.update({name: replay_tool(name) for name in names})
+
+    semaphore = asyncio.Semaphore(concurrency)
+    first_start = min((rec["started_at"] for rec in recordings), default=0)
+    loop_start = time.perf_counter()
+
+    async def run(recording):
+        if pace:
+            delay = recording["started_at"] - first_start - (time.perf_counter() - loop_start)
+            if delay > 0:
+                await asyncio.sleep(delay)
+        async with semaphore:
+            session = ReplaySession(recording, preserve_timing)
+            current_replay.set(session)
+            options = recording.get("options") or {}
+            start_time = time.perf_counter()
+            answer = None
+            async for event in main.stream_agent(recording["question"], use_router=options.get("use_router"),
+                                                 mode=options.get("mode"), client_id=options.get("client_id")):
+                if event["type"] == "answer":
+                    answer = event["content"]
+            recorded_answer = next((e["content"] for e in recording.get("events", []) if e["type"] == "answer"), None)
+            return {
+                "question": recording["question"],
+                "latency": time.perf_counter() - start_time,
+                "recorded_latency": recording["duration"],
+                "llm_calls": session.llm_served,
+                "recorded_llm_calls": len(recording["llm_calls"]),
+                "tool_calls": len(recording["tool_calls"]),
+                "llm_misses": session.llm_misses,
+                "tool_misses": session.tool_misses,
+                "answer_changed": answer != recorded_answer,
+            }
+
+    return await asyncio.gather(*(run(recording) for recording in recordings))
+
+
+def report(results: list) -> dict:
+    def mean(values):
+        return round(sum(values) / len(values), 4) if values else 0.0
+
+    latencies = sorted(r["latency"] for r in results)
+    return {
+        "requests": len(results),
+        "llm_calls_per_request": mean([r["llm_calls"] for r in results]),
+        "recorded_llm_calls_per_request": mean([r["recorded_llm_calls"] for r in results]),
+        "latency_mean_s": mean(latencies),
+        "latency_p95_s": round(percentile(latencies, 95), 4),
+        "recorded_latency_mean_s": mean([r["recorded_latency"] for r in results]),
+        "answers_changed": sum(r["answer_changed"] for r in results),
+        "llm_misses": sum(r["llm_misses"] for r in results),
+        "tool_misses": sum(r["tool_misses"] for r in results),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay recorded agent traffic through stream_agent")
+    parser.add_argument("recordings", help="Recording file (.jsonl or .jsonl.gz)")
+    parser.add_argument("--timing", action="store_true", help="Sleep for the recorded LLM and tool latencies")
+    parser.add_argument("--pace", action="store_true", help="Start requests at their original relative times")
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--limit", type=int, help="Only replay the first N recordings")
+    parser.add_argument("--output", help="Write the JSON report here")
+    args = parser.parse_args()
+
+    recordings = load(args.recordings)[:args.limit]
+    started = time.perf_counter()
+    results = asyncio.run(replay(recordings, args.timing, args.pace, args.concurrency))
+    summary = report(results)
+    summary["wall_time_s"] = round(time.perf_counter() - started, 3)
+    text = json.dumps(summary, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text)
+    print(text)
@@ -0,0 +1,189 @@
+import os
+import re
+
+# Pre-LLM intent router: answers obvious tool questions without a Mistral round trip.
+# Set AGENT_ROUTER=0 to always go through the ReAct loop.
+ROUTER_ENABLED = os.getenv("AGENT_ROUTER", "1") != "0"
+MIN_CONFIDENCE = float(os.getenv("ROUTER_MIN_CONFIDENCE", "0.8"))
+
+
+class Route:
+    def __init__(self, function_name: str, params: dict, confidence: float, rule: str, answer_template: str = "{result}"):
+        self.function_name = function_name
+        self.params = params
+        self.confidence = confidence
+        self.rule = rule
+        self.answer_template = answer_template
+
+    def format_answer(self, result: str) -> str:
+        return self.answer_template.format(result=result, **self.params)
+
+
+class Rule:
+    """
+    A routing rule: a regex that must match the whole (normalized) message and a
+    function that turns the match into tool params. `build` may return None to
+    reject a match it cannot handle.
+    """
+
+    def __init__(self, name: str, pattern: str, function_name: str, build, confidence: float = 0.9,
+                 answer_template: str = "{result}"):
+        self.name = name
+        self.pattern = re.compile(pattern, re.IGNORECASE)
+        self.function_name = function_name
+        self.build = build
+        self.confidence = confidence
+        self.answer_template = answer_template
+
+    def match(self, text: str):
+        match = self.pattern.fullmatch(text)
+        if not match:
+            return None
+        params = self.build(match)
+        if params is None:
+            return None
+        return Route(self.function_name, params, self.confidence, self.name, self.answer_template)
+
+
+def normalize(message: str) -> str:
+    text = " ".join(message.split())
+    return text.rstrip("?!. ").strip()
+
+
+# --- Lightweight classifier -------------------------------------------------
+# Penalizes messages that look like more than a single tool lookup, so
+# "compare the weather in London and Paris" still goes to the model.
+
+MULTI_INTENT = re.compile(r"\b(and|compare|versus|vs|then|also|why|explain|should)\b", re.IGNORECASE)
+TIME_WORDS = re.compile(r"\b(tomorrow|yesterday|forecast|next|last|week|month|year|tonight|weekend)\b", re.IGNORECASE)
+
+
+def classify(text: str, route: Route) -> float:
+    confidence = route.confidence
+    if MULTI_INTENT.search(text):
+        confidence *= 0.5
+    if len(text.split()) > 12:
+        confidence *= 0.7
+    if route.function_name == "get_weather" and TIME_WORDS.search(text):
+        # wttr.in one-liner is current conditions only
+        confidence *= 0.3
+    return confidence
+
+
+# --- Built-in rules ---------------------------------------------------------
+
+ARITHMETIC = r"[\d\s\.\+\-\*/%\(\)]+"
+
+
+# Numbers joined by one repeated "/" or "-" with no spaces: dates (12/25/2023,
+# 2024-03-15) and phone numbers (1-800-555-1234), not sums to work out
+DATE_OR_PHONE = re.compile(r"\d+([/\-])\d+(?:\1\d+)+")
+
+
+def _build_arithmetic(match):
+    expression = match.group("expr").strip()
+    # Needs at least one operator between numbers, "42" alone is not a calculation
+    if not re.search(r"\d\s*(\*\*|[\+\-\*/%])\s*[\(\d\.]", expression):
+        return None
+    if DATE_OR_PHONE.fullmatch(expression):
+        return None
+    return {"expression": expression}
+
+
+def _build_percent(match):
+    return {"expression": f"{match.group('pct')} / 100 * {match.group('value')}"}
+
+
+NOT_A_CITY = {"what", "what's", "how", "how's", "is", "the", "current", "today", "now", "like"}
+
+
+def _build_weather(match):
+    city = match.group("city").strip(" ,")
+    words = city.lower().split()
+    if not words or len(words) > 4 or NOT_A_CITY.intersection(words):
+        return None
+    return {"city": city}
+
+
+# "<city> weather" has no preposition to mark the city, and "Nice weather" or
+# "good weather" is small talk, so that form only routes for well-known cities.
+# Cities that double as everyday words (Nice, Reading, Mobile, Split) are left out.
+KNOWN_CITIES = {
+    "london", "paris", "berlin", "madrid", "rome", "milan", "amsterdam", "brussels", "vienna", "zurich",
+    "geneva", "prague", "warsaw", "budapest", "lisbon", "dublin", "edinburgh", "manchester", "stockholm",
+    "oslo", "copenhagen", "helsinki", "athens", "istanbul", "moscow", "kyiv", "cairo", "lagos", "nairobi",
+    "johannesburg", "cape town", "dubai", "mumbai", "delhi", "new delhi", "bangalore", "bengaluru",
+    "chennai", "kolkata", "hyderabad", "pune", "karachi", "dhaka", "bangkok", "singapore", "jakarta",
+    "manila", "hong kong", "shanghai", "beijing", "seoul", "tokyo", "osaka", "sydney", "melbourne",
+    "auckland", "toronto", "montreal", "vancouver", "new york", "new york city", "nyc", "boston",
+    "chicago", "seattle", "san francisco", "los angeles", "san diego", "austin", "dallas", "houston",
+    "miami", "atlanta", "denver", "washington", "mexico city", "sao paulo", "rio de janeiro",
+    "buenos aires", "lima", "bogota", "santiago",
+}
+
+
+def _build_weather_suffix(match):
+    params = _build_weather(match)
+    if params is None or params["city"].lower() not in KNOWN_CITIES:
+        return None
+    return params
+
+
+def _build_url(match):
+    return {"url": match.group("url")}
+
+
+URL = r"(?P<url>(?:https?://)?[\w\-]+(?:\.[\w\-]+)+(?:/\S*)?)"
+
+rules = [
+    Rule("arithmetic",
+         r"(?:(?:please\s+)?(?:calculate|compute|evaluate|what\s+is|what's)\s+)?(?P<expr>" + ARITHMETIC + r")(?:\s*=)?",
+         "calculate", _build_arithmetic, confidence=0.95),
+    Rule("percent_of",
+         r"(?:(?:calculate|compute|what\s+is|what's)\s+)?(?P<pct>\d+(?:\.\d+)?)\s*%\s+of\s+(?P<value>\d+(?:\.\d+)?)",
+         "calculate", _build_percent, confidence=0.95),
+    Rule("weather",
+         r"(?:(?:what(?:'s|\s+is)|how(?:'s|\s+is))\s+)?(?:the\s+)?(?:current\s+)?weather\s+(?:like\s+)?(?:in|for|at)\s+(?P<city>[A-Za-z][\w\s\.,'\-]*)",
+         "get_weather", _build_weather, confidence=0.9),
+    Rule("weather_suffix",
+         r"(?P<city>[A-Za-z][\w\s\.'\-]*?)\s+weather(?:\s+(?:now|today))?",
+         "get_weather", _build_weather_suffix, confidence=0.85),
+    Rule("response_time",
+         r"(?:(?:what(?:'s|\s+is)|check|measure|get)\s+)?(?:the\s+)?(?:response\s+time|latency|ping)\s+(?:of|for|to)\s+" + URL,
+         "get_response_time", _build_url, confidence=0.9,
+         answer_template="The response time for {url} is {result}."),
+    Rule("how_fast",
+         r"how\s+(?:fast|quick(?:ly)?)\s+(?:is|does)\s+" + URL + r"(?:\s+(?:respond|load))?",
+         "get_response_time", _build_url, confidence=0.85,
+         answer_template="The response time for {url} is {result}."),
+]
+
+
+def add_rule(rule: Rule, first: bool = False):
+    """Register an extra routing rule (first=True to take priority over the built-ins)."""
+    if first:
+        rules.insert(0, rule)
+    else:
+        rules.append(rule)
+
+
+def route(message: str, min_confidence: float = None):
+    """Return the best Route for a message, or None when the agent loop should handle it."""
+    if min_confidence is None:
+        min_confidence = MIN_CONFIDENCE
+    text = normalize(message)
+    if not text:
+        return None
+
+    best = None
+    for rule in rules:
+        candidate = rule.match(text)
+        if candidate is None:
+            continue
+        candidate.confidence = classify(text, candidate)
+        if best is None or candidate.confidence > best.confidence:
+            best = candidate
+
+    if best is None or best.confidence < min_confidence:
+        return None
+    return best
@@ -0,0 +1,46 @@
+# Production entry point: prefork workers sharing one port.
+#
+#     python serve.py                      # One worker per CPU core on :8000
+#     python serve.py --workers 4 --port 8080
+#
+# The parent only supervises (it never imports the agent), so it starts at once
+# and restarts workers that die. SIGTERM / Ctrl+C drains: workers stop accepting
+# connections, let in-flight chat streams finish for up to --drain seconds, then exit.
+# Workers share LLM_CONCURRENCY through the shared state file, so the web tier
+# scales with cores while the model sees no more calls than it allows.
+# For development, `python server.py` runs a single auto-reloading process instead.
+import os
+import argparse
+import tempfile
+import uvicorn
+
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", "0"))            # 0 = one per CPU core
+DRAIN_TIMEOUT = float(os.getenv("SERVER_DRAIN_TIMEOUT", "130"))   # A request at REQUEST_DEADLINE, plus slack
+
+
+def prepare_environment(workers: int, port: int):
+    """Settings every worker inherits: worker count, shared state file, production defaults."""
+    os.environ["WEB_WORKERS"] = str(workers)
+    os.environ.setdefault("STATIC_RELOAD", "0")
+    if workers > 1:
+        path = os.environ.setdefault("SHARED_STATE_PATH",
+                                     os.path.join(tempfile.gettempdir(), f"customagent-{port}.sqlite"))
+        # Tool results are shared through the same file
+        os.environ.setdefault("TOOL_CACHE_PATH", path)
+        import shared_state
+        shared_state.store.reset()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the web server with several worker processes")
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--workers", type=int, default=SERVER_WORKERS, help="Worker processes (0 = one per CPU core)")
+    parser.add_argument("--drain", type=float, default=DRAIN_TIMEOUT,
+                        help="Seconds in-flight requests get to finish on shutdown")
+    args = parser.parse_args()
+
+    workers = args.workers or os.cpu_count() or 1
+    prepare_environment(workers, args.port)
+    uvicorn.run("server:app", host=args.host, port=args.port, workers=workers,
+                timeout_graceful_shutdown=args.drain, log_level="info")
@@ -1,32 +1,196 @@
 from fastapi import FastAPI, Request
-from fastapi.responses import StreamingResponse
-from fastapi.staticfiles import StaticFiles
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
 import uvicorn
+import os
 import json
 import asyncio
-from pydantic import BaseModel
+import contextlib
+from typing import List, Optional, Union
+from pydantic import BaseModel, Field
 from main import stream_agent
+import http_client
+from backends import backend_pool, openai_module
+from limiter import llm_limiter, ClientTracker
+import coalesce
+from coalesce import request_flights
+import metrics
+from cache import tool_cache
+from batch import run_batch, BATCH_MAX_ITEMS
+from assets import AssetCache
+import shared_state
 
-app = FastAPI()
+def warm_up():
+    # Modules that load lazily so a worker starts accepting connections quickly;
+    # import them now, off the event loop, so the first request does not pay for them
+    import probe
+    import wiki_index
+    openai_module()
 
-app.mount("/static", StaticFiles(directory="static"), name="static")
+@contextlib.asynccontextmanager
+async def lifespan(app: FastAPI):
+    asyncio.get_running_loop().run_in_executor(None, warm_up)
+    publisher = asyncio.create_task(shared_state.publish_forever()) if shared_state.store is not None else None
+    yield
+    # Runs once uvicorn has drained in-flight requests (or its drain timeout ran out)
+    await http_client.aclose()
+    await backend_pool.aclose()
+    if publisher is not None:
+        publisher.cancel()
+        shared_state.publish()  # Final counts, so /metrics totals include this worker's last requests
+        shared_state.store.forget_worker(shared_state.WORKER_ID)
+        shared_state.store.close()
+
+app = FastAPI(lifespan=lifespan)
+
+# UI files are read once and served from memory (ETag + gzip)
+static_assets = AssetCache("static")
 
 class ChatRequest(BaseModel):
     message: str
+    timing: bool = False  # Append a 'timing' summary event at the end of the stream
+
+# In-flight chats per client, so one user can't hold every queue place
+client_tracker = ClientTracker()
+
+# How often an idle stream checks whether its client has gone away
+DISCONNECT_POLL = 0.5
+
+async def until_disconnected(http_request: Request, events):
+    """
+    Yield from `events` (an async generator), cancelling it as soon as the client
+    disconnects - even while no event is due, e.g. during a long tool call. The
+    agent runs in its own task so the cancellation reaches whatever it awaits.
+    """
+    queue = asyncio.Queue()
+    done = object()
+
+    async def produce():
+        try:
+            async for event in events:
+                queue.put_nowait(event)
+        finally:
+            queue.put_nowait(done)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                event = await asyncio.wait_for(queue.get(), DISCONNECT_POLL)
+            except asyncio.TimeoutError:
+                if await http_request.is_disconnected():
+                    metrics.DISCONNECTS.inc()
+                    return
+                continue
+            if event is done:
+                await producer  # Re-raise anything the agent raised
+                return
+            yield event
+    finally:
+        if not producer.done():
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+# Peers allowed to name the client with X-Client-Id (e.g. an authenticating reverse
+# proxy). From anyone else the header is ignored: a caller could rotate ids to get
+# around the per-client cap and the fair queue.
+TRUSTED_PROXIES = {host.strip() for host in os.getenv("TRUSTED_PROXIES", "").split(",") if host.strip()}
+
+def client_key(http_request: Request) -> str:
+    peer = http_request.client.host if http_request.client else "anonymous"
+    if peer in TRUSTED_PROXIES:
+        return http_request.headers.get("x-client-id") or peer
+    return peer
 
 @app.post("/api/chat")
-async def chat_endpoint(request: ChatRequest):
+async def chat_endpoint(request: ChatRequest, http_request: Request):
+    client_id = client_key(http_request)
+
+    # Fail fast instead of piling more work onto a saturated Ollama
+    if llm_limiter.is_full():
+        retry_after = llm_limiter.retry_after()
+        return JSONResponse({"error": "Server is busy, please retry later."}, status_code=503,
+                            headers={"Retry-After": str(retry_after)})
+    if not client_tracker.try_start(client_id):
+        return JSONResponse({"error": "Too many concurrent requests from this client."}, status_code=429,
+                            headers={"Retry-After": str(llm_limiter.retry_after())})
+
+    if coalesce.COALESCE_REQUESTS:
+        # Identical questions in flight share one agent run and get the same events
+        key = coalesce.normalize_message(request.message)
+        events = request_flights.stream(key, lambda: stream_agent(request.message, client_id=client_id,
+                                                                  include_timing=request.timing or None))
+    else:
+        events = stream_agent(request.message, client_id=client_id, include_timing=request.timing or None)
+
     async def event_generator():
-        async for event in stream_agent(request.message):
-            yield f"data: {json.dumps(event)}\n\n"
-            
-        yield "data: [DONE]\n\n"
+        try:
+            async for event in until_disconnected(http_request, events):
+                yield f"data: {json.dumps(event)}\n\n"
+                
+            yield "data: [DONE]\n\n"
+        finally:
+            client_tracker.finish(client_id)
 
     return StreamingResponse(event_generator(), media_type="text/event-stream")
 
+class BatchItem(BaseModel):
+    id: Optional[Union[str, int]] = None
+    question: str
+
+class BatchRequest(BaseModel):
+    questions: List[Union[str, BatchItem]]
+    concurrency: Optional[int] = Field(None, ge=1)  # Defaults to BATCH_CONCURRENCY, capped by batch.py
+
+@app.post("/api/batch")
+async def batch_endpoint(request: BatchRequest, http_request: Request):
+    if len(request.questions) > BATCH_MAX_ITEMS:
+        return JSONResponse({"error": f"At most {BATCH_MAX_ITEMS} questions per batch."}, status_code=413)
+    client_id = client_key(http_request)
+    if llm_limiter.is_full():
+        return JSONResponse({"error": "Server is busy, please retry later."}, status_code=503,
+                            headers={"Retry-After": str(llm_limiter.retry_after())})
+    if not client_tracker.try_start(client_id):
+        return JSONResponse({"error": "Too many concurrent requests from this client."}, status_code=429,
+                            headers={"Retry-After": str(llm_limiter.retry_after())})
+
+    items = [item if isinstance(item, str) else item.model_dump(exclude_none=True) for item in request.questions]
+
+    async def lines():
+        # One JSON object per line as each question finishes, then a summary line.
+        # Batch items queue for LLM slots under their own client id, so the fair
+        # queue keeps interactive chats from waiting behind a whole batch, and
+        # batch.batch_gate() keeps batches from filling the queue itself.
+        try:
+            async for line in until_disconnected(http_request, run_batch(items, request.concurrency,
+                                                                          client_id=f"{client_id}:batch")):
+                yield json.dumps(line) + "\n"
+        finally:
+            client_tracker.finish(client_id)
+
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+# Scrape-time gauges for shared state owned by other modules
+metrics.register(metrics.Gauge("llm_slots_active", "LLM calls currently running", lambda: llm_limiter.active))
+metrics.register(metrics.Gauge("llm_queue_length", "LLM calls waiting for a slot", lambda: llm_limiter.queued))
+metrics.register(metrics.Gauge("llm_queue_rejected", "Calls rejected because the LLM queue was full", lambda: llm_limiter.rejected))
+metrics.register(metrics.Gauge("llm_backends_available", "LLM backends that are healthy with a closed breaker", backend_pool.healthy_count))
+metrics.register(metrics.Gauge("tool_cache_hits", "Tool result cache hits", lambda: tool_cache.hits))
+metrics.register(metrics.Gauge("tool_cache_misses", "Tool result cache misses", lambda: tool_cache.misses))
+metrics.register(metrics.Gauge("tool_cache_size", "Entries in the tool result cache", lambda: len(tool_cache.entries)))
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    # With several workers this merges every worker's snapshot from the shared store
+    text = await asyncio.to_thread(shared_state.render_metrics)
+    return PlainTextResponse(text, media_type="text/plain; version=0.0.4")
+
+@app.get("/static/{name:path}")
+async def static_file(name: str, request: Request):
+    return static_assets.response(name, request)
+
 @app.get("/")
-async def root():
-    return StreamingResponse(open("static/index.html", "rb"), media_type="text/html")
+async def root(request: Request):
+    return static_assets.response("index.html", request)
 
 if __name__ == "__main__":
     uvicorn.run("server:app", host="0.0.0.0", port=8000, reload=True)
@@ -0,0 +1,151 @@
+# State shared by the server's worker processes (python serve.py --workers N).
+#
+# Each worker keeps its own in-memory state; this SQLite file is where they meet.
+# It holds the tool cache's second tier (TOOL_CACHE_PATH points at the same file),
+# the server-wide LLM slots the workers' limiters share, and a metrics snapshot
+# per worker, which /metrics merges so a scrape sees the whole server rather than
+# whichever worker happened to answer it.
+import os
+import json
+import time
+import asyncio
+import sqlite3
+import threading
+import metrics
+
+SHARED_STATE_PATH = os.getenv("SHARED_STATE_PATH")                 # Unset: one process, nothing to share
+PUBLISH_INTERVAL = float(os.getenv("SHARED_STATE_INTERVAL", "5"))  # Seconds between metric snapshots
+WORKER_ID = str(os.getpid())
+
+SCHEMA = "CREATE TABLE IF NOT EXISTS worker_metrics (worker TEXT PRIMARY KEY, updated REAL NOT NULL, data TEXT NOT NULL)"
+SLOTS_SCHEMA = ("CREATE TABLE IF NOT EXISTS llm_slots "
+                "(id INTEGER PRIMARY KEY AUTOINCREMENT, worker TEXT NOT NULL, granted INTEGER NOT NULL DEFAULT 0)")
+
+
+class SharedStore:
+    def __init__(self, path: str):
+        self.conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        self.conn.execute(SLOTS_SCHEMA)
+        self.conn.commit()
+        self.lock = threading.Lock()
+
+    def publish(self, worker: str, snapshot: dict):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO worker_metrics (worker, updated, data) VALUES (?, ?, ?)",
+                              (worker, time.time(), json.dumps(snapshot)))
+            self.conn.commit()
+
+    def snapshots(self) -> dict:
+        """{worker: (last update time, snapshot)} for every worker that has published."""
+        with self.lock:
+            rows = self.conn.execute("SELECT worker, updated, data FROM worker_metrics").fetchall()
+        return {worker: (updated, json.loads(data)) for worker, updated, data in rows}
+
+    def reset(self):
+        # A new server run starts counting from zero
+        with self.lock:
+            self.conn.execute("DELETE FROM worker_metrics")
+            self.conn.execute("DELETE FROM llm_slots")
+            self.conn.commit()
+
+    def forget_worker(self, worker: str):
+        """Drop a stopping worker's LLM slots and place in line (its metrics stay counted)."""
+        with self.lock:
+            self.conn.execute("DELETE FROM llm_slots WHERE worker = ?", (worker,))
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def _alive(worker: str) -> bool:
+    # Workers are processes on this host, named by pid
+    try:
+        os.kill(int(worker), 0)
+    except ProcessLookupError:
+        return False
+    except (OSError, ValueError):
+        pass  # e.g. not ours to signal: still running
+    return True
+
+
+class SharedSlots:
+    """
+    Server-wide LLM slots, shared by the limiters of every worker through the store.
+    A worker with calls waiting keeps one request in line, and requests are granted
+    oldest first while fewer than `total` slots are held, so workers take turns the
+    way clients do inside one limiter. Slots of workers that died are reclaimed.
+    Each call is one short transaction; run them off the event loop.
+    """
+
+    def __init__(self, store: SharedStore, total: int, worker: str = WORKER_ID):
+        self.store = store
+        self.total = total
+        self.worker = worker
+
+    def claim(self, request_id: int = None) -> tuple:
+        """Get in line (request_id None) or check on a request: (request_id, granted)."""
+        with self.store.lock:
+            conn = self.store.conn
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if request_id is None:
+                    request_id = conn.execute("INSERT INTO llm_slots (worker) VALUES (?)", (self.worker,)).lastrowid
+                for (worker,) in conn.execute("SELECT DISTINCT worker FROM llm_slots WHERE worker != ?",
+                                              (self.worker,)).fetchall():
+                    if not _alive(worker):
+                        conn.execute("DELETE FROM llm_slots WHERE worker = ?", (worker,))
+                held = conn.execute("SELECT COUNT(*) FROM llm_slots WHERE granted = 1").fetchone()[0]
+                granted = False
+                if held < self.total:
+                    first = conn.execute("SELECT id FROM llm_slots WHERE granted = 0 ORDER BY id LIMIT ?",
+                                         (self.total - held,)).fetchall()
+                    if (request_id,) in first:
+                        conn.execute("UPDATE llm_slots SET granted = 1 WHERE id = ?", (request_id,))
+                        granted = True
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+        return request_id, granted
+
+    def release(self, request_id: int):
+        """Give back a granted slot, or leave the line."""
+        with self.store.lock:
+            self.store.conn.execute("DELETE FROM llm_slots WHERE id = ?", (request_id,))
+            self.store.conn.commit()
+
+
+store = SharedStore(SHARED_STATE_PATH) if SHARED_STATE_PATH else None
+
+
+def publish():
+    if store is not None:
+        store.publish(WORKER_ID, metrics.snapshot())
+
+
+def render_metrics() -> str:
+    """Prometheus text for the whole server: counters summed over workers, gauges per live worker."""
+    if store is None:
+        return metrics.render()
+    publish()
+    now = time.time()
+    snapshots = {}
+    live = set()
+    for worker, (updated, snapshot) in store.snapshots().items():
+        snapshots[worker] = snapshot
+        if now - updated < 3 * PUBLISH_INTERVAL:
+            live.add(worker)
+    return metrics.render_merged(snapshots, live)
+
+
+async def publish_forever():
+    while True:
+        await asyncio.sleep(PUBLISH_INTERVAL)
+        try:
+            await asyncio.to_thread(publish)
+        except sqlite3.Error:
+            pass  # Locked for longer than the busy timeout; the next round catches up
@@ -0,0 +1,89 @@
+import re
+
+# Pattern stream_agent uses to pull the Action JSON out of a reply:
+# a single {...} action or a [...] list of actions to run concurrently
+ACTION_PATTERN = re.compile(r'Action:\s*(\{.*?\}|\[.*?\])\s*PAUSE', re.DOTALL)
+
+
+class StreamParser:
+    """
+    Incremental parser for a streamed ReAct reply.
+    Feed it content deltas as they arrive; it returns the new text that follows
+    `Answer:` (for answer_delta events) and flags when a complete
+    `Action: {...} PAUSE` block has been generated so the caller can stop decoding.
+    """
+
+    def __init__(self):
+        self.text = ""
+        self.action_match = None
+        self._action_pos = -1      # Index of the first "Action:" marker
+        self._answer_pos = -1      # Index where the answer text starts
+        self._emitted = 0          # Answer characters already handed out
+
+    @property
+    def action_complete(self) -> bool:
+        return self.action_match is not None
+
+    def feed(self, delta: str) -> list:
+        if not delta or self.action_match:
+            return []
+
+        start = max(len(self.text) - len("Answer:"), 0)  # markers may straddle chunks
+        self.text += delta
+
+        if self._action_pos < 0:
+            self._action_pos = self.text.find("Action:", start)
+
+        if self._action_pos >= 0 and "PAUSE" in self.text[self._action_pos:]:
+            match = ACTION_PATTERN.search(self.text, self._action_pos)
+            if match:
+                # Drop anything generated after PAUSE - it is never used
+                self.action_match = match
+                self.text = self.text[:match.end()]
+                return []
+
+        if self._answer_pos < 0:
+            marker = self.text.find("Answer:", start)
+            # An Answer that comes after an Action is not a direct answer
+            if marker < 0 or (0 <= self._action_pos < marker):
+                return []
+            self._answer_pos = marker + len("Answer:")
+
+        if 0 <= self._action_pos:
+            return []
+
+        pending = self.text[self._answer_pos + self._emitted:]
+        if self._emitted == 0:
+            # Skip the whitespace right after the marker, like the final answer's strip()
+            stripped = pending.lstrip()
+            self._answer_pos += len(pending) - len(stripped)
+            pending = stripped
+        if not pending:
+            return []
+        self._emitted += len(pending)
+        return [pending]
+
+
+class ToolCallAccumulator:
+    """
+    Reassembles streamed `tool_calls` deltas (OpenAI-compatible API) into complete
+    calls. Each delta carries an index plus fragments of id/name/arguments.
+    """
+
+    def __init__(self):
+        self.calls = {}
+
+    def feed(self, deltas):
+        for delta in deltas or []:
+            index = delta.index if delta.index is not None else len(self.calls)
+            call = self.calls.setdefault(index, {"id": None, "name": "", "arguments": ""})
+            if delta.id:
+                call["id"] = delta.id
+            if delta.function is not None:
+                if delta.function.name:
+                    call["name"] += delta.function.name
+                if delta.function.arguments:
+                    call["arguments"] += delta.function.arguments
+
+    def result(self) -> list:
+        return [self.calls[index] for index in sorted(self.calls)]
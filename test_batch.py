@@ -0,0 +1,54 @@
+import asyncio
+import batch
+import main
+from limiter import acquire_slot
+
+# Offline checks for batch mode: python -m pytest test_batch.py
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_batches_leave_queue_room_for_chats(monkeypatch):
+    # One worker's share of a small server: 1 LLM slot, 16 queue places
+    monkeypatch.setattr(main.llm_limiter, "max_concurrent", 1)
+    monkeypatch.setattr(main.llm_limiter, "max_queue", 16)
+    monkeypatch.setattr(main.llm_limiter, "rejected", 0)
+    peak_queued = []
+
+    async def fake_agent(question, client_id=None, include_timing=False):
+        # One LLM call per question, through the real limiter
+        async for event in acquire_slot(client_id):
+            yield event
+        peak_queued.append(main.llm_limiter.queued)
+        await asyncio.sleep(0.002)
+        main.llm_limiter.release()
+        yield {"type": "answer", "content": question.upper()}
+
+    monkeypatch.setattr(main, "stream_agent", fake_agent)
+
+    async def scenario():
+        results, chat_waited = [], []
+
+        async def chat():
+            await asyncio.sleep(0.01)
+            # An interactive call arriving mid-batch still finds a queue place
+            assert not main.llm_limiter.is_full()
+            async for event in acquire_slot("interactive"):
+                chat_waited.append(event)
+            main.llm_limiter.release()
+
+        chatting = asyncio.create_task(chat())
+        async for line in batch.run_batch([f"question {i}" for i in range(40)], concurrency=32,
+                                          client_id="someone:batch"):
+            results.append(line)
+        await chatting
+        return results
+
+    results = run(scenario())
+    summary = results[-1]
+    assert summary["errors"] == 0 and summary["answered"] == 40
+    assert summary["concurrency"] == batch.batch_limit() == 8
+    # At most 7 batch questions waiting (one holds the slot), plus the chat
+    assert max(peak_queued) <= 8 and main.llm_limiter.rejected == 0
@@ -0,0 +1,69 @@
+import time
+import pytest
+import calculator
+from actions import calculate
+
+# Offline checks for the calculate engine: python -m pytest test_calculator.py
+
+
+def test_arithmetic_and_functions():
+    assert calculator.evaluate("2 * 3.5 + 10") == 17.0
+    assert calculator.evaluate("2^10") == 1024
+    assert calculator.evaluate("2**0") == 1 and isinstance(calculator.evaluate("2**0"), int)
+    assert calculator.evaluate("7 // 2 + 7 % 2") == 4
+    assert calculator.evaluate("sqrt(16) + log(e) + factorial(5)") == 125.0
+    assert calculator.evaluate("comb(5, 2) * gcd(12, 18)") == 60
+    assert calculator.evaluate("6 × 7 ÷ 2") == 21.0
+    assert calculator.evaluate("max(1,234)") == 234
+
+
+@pytest.mark.parametrize("expression", [
+    "pow(9, 9**9)", "10**10**8", "9**9**9", "factorial(5000)", "comb(100000, 50000)",
+    "perm(10000)", "2**5000 * 2**5000", "exp(1000)", "10.0**400", "round(1, 1000)",
+])
+def test_cost_caps_reject_huge_work_quickly(expression):
+    start = time.perf_counter()
+    with pytest.raises(calculator.CalculationError):
+        calculator.evaluate(expression)
+    assert time.perf_counter() - start < 0.1
+
+
+def test_caps_allow_results_under_the_limit():
+    assert calculator.evaluate("2**4000").bit_length() == 4001
+    assert calculator.evaluate("pow(9, 9**9, 1000)") == pow(9, 9 ** 9, 1000)
+    assert calculator.evaluate("factorial(300)") > 0
+
+
+@pytest.mark.parametrize("expression", [
+    "__import__('os')", "(1).real", "[1, 2]", "{1: 2}", "x", "lambda: 1", "2 if 1 else 3",
+    "'a' * 3", "True + 1", "1 < 2", "abs(x=1)", "(lambda: 1)()", "open('f')", "a.b()",
+    "f'{1}'", "[i for i in range(3)]", "(x := 1)", "1; import os",
+])
+def test_rejected_syntax(expression):
+    with pytest.raises(calculator.CalculationError):
+        calculator.evaluate(expression)
+
+
+def test_size_limits():
+    with pytest.raises(calculator.CalculationError, match="longer than"):
+        calculator.evaluate("1+" * calculator.MAX_LENGTH + "1")
+    with pytest.raises(calculator.CalculationError, match="parts"):
+        calculator.evaluate("+".join(["1"] * 150))
+    with pytest.raises(calculator.CalculationError, match="at most"):
+        calculator.evaluate_many(["1"] * (calculator.MAX_BATCH + 1))
+
+
+def test_runtime_errors_are_calculation_errors():
+    for expression in ["1/0", "sqrt(-1)", "log(0)", "factorial(-1)", "factorial(2.5)"]:
+        with pytest.raises(calculator.CalculationError):
+            calculator.evaluate(expression)
+
+
+def test_batching_edge_cases():
+    assert calculate("2+2;") == "4"
+    assert calculate(";2+2") == "4"
+    assert calculate("2+2;;3*3") == "2+2 = 4\n3*3 = 9"
+    assert calculate("2^10; sqrt(2) * pi\n1/0") == (
+        "2^10 = 1024\nsqrt(2) * pi = 4.442882938158366\n1/0 = Error: division by zero")
+    assert calculate(";").startswith("Error") and calculate("").startswith("Error")
+    assert calculate("1; x").endswith("x = Error: unknown name 'x'")
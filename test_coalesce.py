@@ -0,0 +1,152 @@
+import asyncio
+import pytest
+import main
+from coalesce import SingleFlight, COALESCED
+from limiter import LLMLimiter, SlotLease
+
+# Offline checks for single-flight coalescing: python -m pytest test_coalesce.py
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def producer(items, started, gate, log=None):
+    async def produce():
+        started.append(1)
+        try:
+            for item in items:
+                yield item
+                await gate.wait()
+        finally:
+            if log is not None:
+                log.append("closed")
+    return produce
+
+
+def test_late_joiner_replays_then_follows_live():
+    async def scenario():
+        flights = SingleFlight("test")
+        started, gate = [], asyncio.Event()
+        factory = producer(["a", "b", "c"], started, gate)
+        leader = flights.stream("k", factory)
+        assert await leader.__anext__() == "a"
+        await asyncio.sleep(0)
+        # Joins after "a" was produced: gets it replayed, then the rest live
+        follower = flights.stream("k", factory)
+        assert await follower.__anext__() == "a"
+        gate.set()
+        assert [item async for item in leader] == ["b", "c"]
+        assert [item async for item in follower] == ["b", "c"]
+        assert started == [1] and not flights.in_flight("k")
+    run(scenario())
+
+
+def test_producer_is_cancelled_when_the_last_subscriber_leaves():
+    async def scenario():
+        flights = SingleFlight("test")
+        started, gate, log = [], asyncio.Event(), []
+        factory = producer(["a", "b"], started, gate, log)
+        first, second = flights.stream("k", factory), flights.stream("k", factory)
+        assert await first.__anext__() == "a"
+        assert await second.__anext__() == "a"
+        await first.aclose()
+        await asyncio.sleep(0)
+        assert log == [] and flights.in_flight("k")   # Still one subscriber
+        task = flights.flights["k"].task
+        await second.aclose()
+        await asyncio.gather(task, return_exceptions=True)
+        assert log == ["closed"] and not flights.in_flight("k")
+    run(scenario())
+
+
+def test_errors_reach_every_subscriber():
+    async def scenario():
+        flights = SingleFlight("test")
+
+        async def failing():
+            yield "a"
+            raise ValueError("boom")
+
+        streams = [flights.stream("k", failing), flights.stream("k", failing)]
+        for stream in streams:
+            with pytest.raises(ValueError):
+                async for _ in stream:
+                    pass
+    run(scenario())
+
+
+def test_call_shares_one_result_and_counts_joiners():
+    async def scenario():
+        flights = SingleFlight("test-call")
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            await asyncio.sleep(0.01)
+            return 42
+
+        results = await asyncio.gather(*(flights.call("k", compute) for _ in range(3)))
+        assert results == [42, 42, 42] and calls == [1]
+        assert dict((tuple(k), v) for k, v in COALESCED.snapshot())[("test-call",)] == 2
+    run(scenario())
+
+
+def test_on_done_waits_for_the_producer_not_the_starter():
+    async def scenario():
+        flights = SingleFlight("test")
+        started, gate, done = [], asyncio.Event(), []
+        factory = producer(["a", "b"], started, gate)
+        leader = flights.stream("k", factory, on_done=lambda: done.append("leader"))
+        assert await leader.__anext__() == "a"
+        follower = flights.stream("k", factory, on_done=lambda: done.append("follower"))
+        assert await follower.__anext__() == "a"
+        # A joiner needs nothing of its own, the starter's resources stay with the flight
+        assert done == ["follower"]
+        await leader.aclose()
+        await asyncio.sleep(0)
+        assert done == ["follower"]
+        gate.set()
+        assert [item async for item in follower] == ["b"]
+        await asyncio.sleep(0)
+        assert done == ["follower", "leader"]
+    run(scenario())
+
+
+def test_slot_stays_with_a_shared_llm_stream_after_the_leader_leaves(monkeypatch):
+    async def scenario():
+        limiter = LLMLimiter(max_concurrent=1, max_queue=4)
+        gate = asyncio.Event()
+
+        class Stream:
+            async def __aiter__(self):
+                for _ in range(3):
+                    yield type("Chunk", (), {"usage": None, "choices": [object()]})()
+                    await gate.wait()
+
+            async def close(self):
+                pass
+
+        class Completions:
+            async def create(self, **request):
+                return Stream()
+
+        monkeypatch.setattr(main.coalesce, "COALESCE_LLM", True)
+        monkeypatch.setattr(main.client.chat, "completions", Completions())
+        request = {"model": "m", "messages": [{"role": "user", "content": "hi"}]}
+        limiter.enqueue("leader")
+        leader = main.llm_chunks(request, SlotLease(limiter))
+        await leader.__anext__()
+        assert main.joins_llm_flight(request)
+        follower = main.llm_chunks(request)
+        await follower.__anext__()
+        # The leader is cancelled (deadline, disconnect): the stream goes on for the follower
+        await leader.aclose()
+        await asyncio.sleep(0)
+        assert limiter.active == 1
+        gate.set()
+        async for _ in follower:
+            pass
+        await asyncio.sleep(0)
+        assert limiter.active == 0
+    run(scenario())
@@ -0,0 +1,63 @@
+import context_budget
+from context_budget import count_tokens, messages_tokens, compact_observation, compact_reply, fit_budget
+
+# Offline checks for prompt budgeting: python -m pytest test_context_budget.py
+
+
+def test_token_estimate_counts_digits_and_punctuation():
+    assert count_tokens("") == 0
+    assert count_tokens("hello") == 1
+    assert count_tokens("2024") == 4
+    assert count_tokens("a, b.") == 4
+    assert count_tokens("internationalization") > 1
+
+
+def test_short_observations_are_kept():
+    assert compact_observation("Current weather in Paris: Sunny +20°C", 50) == \
+        "Current weather in Paris: Sunny +20°C"
+
+
+def test_long_observation_is_cut_at_a_sentence():
+    text = " ".join(f"Sentence number {i} is here." for i in range(200))
+    cut = compact_observation(text, 40)
+    assert count_tokens(cut) < 60
+    assert cut.startswith("Sentence number 0 is here.")
+    assert "more tokens cut]" in cut
+    assert "is here. ..." in cut
+
+
+def test_combined_results_share_the_budget():
+    part = " ".join(["word"] * 300)
+    cut = compact_observation(f"[1] get_weather(city='A'): {part}\n[2] web_search(query='B'): {part}", 100)
+    first, second = cut.split("\n[2] ")
+    assert first.startswith("[1] ") and "cut]" in first and "cut]" in second
+
+
+def test_compact_reply_keeps_only_the_action():
+    reply = 'Thought: I need the weather.\nAction: {"function_name": "get_weather", "function_params": {"city": "Paris"}}\nPAUSE'
+    assert compact_reply(reply) == 'Action:\n{"function_name": "get_weather", "function_params": {"city": "Paris"}}\nPAUSE'
+    assert compact_reply("Answer: 42") == "Answer: 42"
+
+
+def exchange(n, size):
+    body = " ".join(["token"] * size)
+    return [{"role": "assistant", "content": f"Action {n}: {body}"},
+            {"role": "user", "content": f"Observation {n}: {body}"}]
+
+
+def test_fit_budget_drops_oldest_exchanges_but_keeps_head_and_latest():
+    head = [{"role": "system", "content": "system prompt"}, {"role": "user", "content": "question"}]
+    messages = head + exchange(1, 100) + exchange(2, 100) + exchange(3, 100)
+    fitted = fit_budget(messages, budget=messages_tokens(messages) - 50)
+    assert fitted[:2] == head
+    assert [m["content"].split(":")[0] for m in fitted[2:]] == ["Action 2", "Observation 2", "Action 3", "Observation 3"]
+    # Even an impossible budget keeps the head and the latest exchange
+    fitted = fit_budget(messages, budget=1)
+    assert fitted == head + exchange(3, 100)
+
+
+def test_fit_budget_leaves_small_prompts_alone():
+    messages = [{"role": "system", "content": "s"}, {"role": "user", "content": "q"}] + exchange(1, 5)
+    assert fit_budget(messages, budget=10_000) is messages
+    assert fit_budget(messages, budget=0) is messages
+    assert context_budget.PROMPT_BUDGET > 0
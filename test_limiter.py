@@ -0,0 +1,120 @@
+import asyncio
+import pytest
+from limiter import LLMLimiter, ClientTracker, QueueFull, QueueTimeout, acquire_slot
+from shared_state import SharedStore, SharedSlots
+
+# Offline checks for LLM admission control: python -m pytest test_limiter.py
+
+
+def run(coro):
+    return asyncio.run(coro)
+
+
+def test_slots_then_queue_then_reject():
+    async def scenario():
+        limiter = LLMLimiter(max_concurrent=2, max_queue=2)
+        first, second = limiter.enqueue("a"), limiter.enqueue("b")
+        assert first.granted.done() and second.granted.done()
+        third, fourth = limiter.enqueue("a"), limiter.enqueue("c")
+        assert not third.granted.done() and limiter.queued == 2
+        with pytest.raises(QueueFull) as error:
+            limiter.enqueue("d")
+        assert error.value.retry_after >= 1 and limiter.rejected == 1
+        limiter.release(1.0)
+        assert third.granted.done() and limiter.active == 2 and limiter.queued == 1
+    run(scenario())
+
+
+def test_round_robin_across_clients():
+    async def scenario():
+        limiter = LLMLimiter(max_concurrent=1, max_queue=10)
+        limiter.enqueue("busy")
+        heavy = [limiter.enqueue("heavy") for _ in range(3)]
+        light = limiter.enqueue("light")
+        # The light client's single call is second in line, not behind all of heavy's
+        assert limiter.position(heavy[0]) == 1
+        assert limiter.position(light) == 2
+        assert limiter.position(heavy[1]) == 3
+        order = []
+        for _ in range(4):
+            limiter.release()
+            order.append(next(t for t in heavy + [light] if t.granted.done() and t not in order))
+        assert order == [heavy[0], light, heavy[1], heavy[2]]
+    run(scenario())
+
+
+def test_cancel_gives_up_the_place():
+    async def scenario():
+        limiter = LLMLimiter(max_concurrent=1, max_queue=10)
+        limiter.enqueue("a")
+        waiting = limiter.enqueue("b")
+        limiter.cancel(waiting)
+        assert limiter.queued == 0 and not limiter.turns
+        limiter.release()
+        assert limiter.active == 0
+    run(scenario())
+
+
+def test_acquire_slot_reports_position_and_times_out():
+    async def scenario():
+        limiter = LLMLimiter(max_concurrent=1, max_queue=10)
+        limiter.enqueue("holder")
+        events = []
+        with pytest.raises(QueueTimeout):
+            async for event in acquire_slot("waiter", limiter, timeout=0.05):
+                events.append(event)
+        assert events and events[0]["type"] == "queue" and events[0]["position"] == 1
+        # The abandoned ticket no longer holds a place
+        assert limiter.queued == 0
+    run(scenario())
+
+
+def test_acquire_slot_hands_over_a_released_slot():
+    async def scenario():
+        limiter = LLMLimiter(max_concurrent=1, max_queue=10)
+        limiter.enqueue("holder")
+        asyncio.get_running_loop().call_later(0.05, limiter.release)
+        async for _ in acquire_slot("waiter", limiter, timeout=5):
+            pass
+        assert limiter.active == 1 and limiter.queued == 0
+    run(scenario())
+
+
+def test_client_tracker_caps_in_flight_requests():
+    tracker = ClientTracker(max_per_client=2)
+    assert tracker.try_start("a") and tracker.try_start("a")
+    assert not tracker.try_start("a")
+    assert tracker.try_start("b")
+    tracker.finish("a")
+    assert tracker.try_start("a")
+    tracker.finish("a")
+    tracker.finish("a")
+    assert "a" not in tracker.in_flight
+
+
+def test_workers_share_the_llm_slots(tmp_path):
+    async def scenario():
+        store = SharedStore(str(tmp_path / "shared.db"))
+        workers = [LLMLimiter(max_concurrent=1, max_queue=4, slots=SharedSlots(store, 1)) for _ in range(2)]
+        first = workers[0].enqueue("a")
+        await asyncio.wait_for(first.granted, 1)
+        second = workers[1].enqueue("b")
+        await asyncio.sleep(0.2)
+        # One slot server-wide: the other worker waits although its own limiter is idle
+        assert not second.granted.done()
+        workers[0].release()
+        await asyncio.wait_for(second.granted, 1)
+        workers[1].release()
+        await asyncio.sleep(0.1)
+        assert store.conn.execute("SELECT COUNT(*) FROM llm_slots").fetchone()[0] == 0
+        store.close()
+    run(scenario())
+
+
+def test_slots_of_a_dead_worker_are_reclaimed(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    dead = SharedSlots(store, 1, worker="999999999")
+    assert dead.claim()[1]
+    request_id, granted = SharedSlots(store, 1).claim()
+    assert granted
+    store.close()
@@ -0,0 +1,33 @@
+import router
+
+# Offline checks for the fast-path router: python -m pytest test_router.py
+
+
+def routed(message):
+    route = router.route(message)
+    return (route.function_name, route.params) if route else None
+
+
+def test_routes_unambiguous_questions():
+    assert routed("What is 12 * 7?") == ("calculate", {"expression": "12 * 7"})
+    assert routed("15% of 80") == ("calculate", {"expression": "15 / 100 * 80"})
+    assert routed("What's the weather in Paris?") == ("get_weather", {"city": "Paris"})
+    assert routed("weather in Nice") == ("get_weather", {"city": "Nice"})
+    assert routed("London weather") == ("get_weather", {"city": "London"})
+    assert routed("response time of example.com") == ("get_response_time", {"url": "example.com"})
+
+
+def test_small_talk_about_weather_goes_to_the_model():
+    for message in ["Nice weather today!", "Lovely weather", "good weather", "Nice weather"]:
+        assert routed(message) is None, message
+
+
+def test_dates_and_phone_numbers_are_not_calculations():
+    for message in ["12/25/2023", "2024-03-15", "1-800-555-1234", "what is 2024-03-15"]:
+        assert routed(message) is None, message
+
+
+def test_ambiguous_messages_go_to_the_model():
+    for message in ["42", "compare the weather in London and Paris", "weather in London tomorrow",
+                    "Tell me a joke"]:
+        assert routed(message) is None, message
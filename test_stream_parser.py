@@ -0,0 +1,67 @@
+import json
+import types
+from stream_parser import StreamParser, ToolCallAccumulator
+
+# Offline checks for the streamed-reply parser: python -m pytest test_stream_parser.py
+
+
+def feed_all(parser, chunks):
+    deltas = []
+    for chunk in chunks:
+        deltas.extend(parser.feed(chunk))
+    return deltas
+
+
+def test_answer_deltas_with_marker_split_across_chunks():
+    parser = StreamParser()
+    deltas = feed_all(parser, ["Thought: easy.\nAns", "wer:", "  Hello", " there", "!"])
+    assert "".join(deltas) == "Hello there!"
+    assert not parser.action_complete
+
+
+def test_action_block_completes_and_drops_trailing_text():
+    parser = StreamParser()
+    chunks = ['Thought: search.\nAct', 'ion: {"function_name": "web_search", ',
+              '"function_params": {"query": "Google CEO"}}\nPA', 'USE\nObservation: made up']
+    assert feed_all(parser, chunks) == []
+    assert parser.action_complete
+    assert parser.text.endswith("PAUSE")
+    assert json.loads(parser.action_match.group(1))["function_params"] == {"query": "Google CEO"}
+    assert parser.feed("more text") == []
+
+
+def test_action_list_for_parallel_calls():
+    parser = StreamParser()
+    feed_all(parser, ['Action: [{"function_name": "get_weather", "function_params": {"city": "Paris"}}, ',
+                      '{"function_name": "get_weather", "function_params": {"city": "Rome"}}] PAUSE'])
+    assert parser.action_complete
+    assert len(json.loads(parser.action_match.group(1))) == 2
+
+
+def test_answer_after_action_is_not_streamed():
+    parser = StreamParser()
+    deltas = feed_all(parser, ['Action: {"function_name": "calculate", ', 'Answer: 4'])
+    assert deltas == []
+
+
+def test_incomplete_action_is_not_complete():
+    parser = StreamParser()
+    feed_all(parser, ['Action: {"function_name": "calculate", "function_params": {"expression": "2+2"}}'])
+    assert not parser.action_complete
+
+
+def delta(index, id=None, name=None, arguments=None):
+    return types.SimpleNamespace(index=index, id=id,
+                                 function=types.SimpleNamespace(name=name, arguments=arguments))
+
+
+def test_tool_call_accumulator_joins_fragments_by_index():
+    calls = ToolCallAccumulator()
+    calls.feed([delta(0, id="a", name="get_weather", arguments='{"ci')])
+    calls.feed([delta(1, id="b", name="calculate", arguments='{"expression"')])
+    calls.feed([delta(0, arguments='ty": "Paris"}'), delta(1, arguments=': "2+2"}')])
+    calls.feed(None)
+    assert calls.result() == [
+        {"id": "a", "name": "get_weather", "arguments": '{"city": "Paris"}'},
+        {"id": "b", "name": "calculate", "arguments": '{"expression": "2+2"}'},
+    ]
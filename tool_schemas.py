@@ -0,0 +1,52 @@
+import inspect
+
+# Python annotation -> JSON schema type
+JSON_TYPES = {str: "string", int: "integer", float: "number", bool: "boolean", list: "array", dict: "object"}
+
+
+def parse_docstring(doc: str, param_names) -> tuple:
+    """
+    Split a tool docstring into (description, {param: description}).
+    Lines of the form `<param>: text` describe parameters; every other line is
+    part of the tool description.
+    """
+    description_lines = []
+    params = {}
+    for line in inspect.cleandoc(doc or "").splitlines():
+        line = line.strip()
+        name, sep, text = line.partition(":")
+        if sep and name in param_names:
+            params[name] = text.strip()
+        elif line:
+            description_lines.append(line)
+    return " ".join(description_lines), params
+
+
+def function_schema(name: str, func) -> dict:
+    """Build an OpenAI-style `tools` entry from a tool's signature and docstring."""
+    parameters = inspect.signature(func).parameters
+    description, param_docs = parse_docstring(func.__doc__, parameters)
+    properties = {}
+    required = []
+    for param in parameters.values():
+        if param.kind in (param.VAR_POSITIONAL, param.VAR_KEYWORD):
+            continue
+        prop = {"type": JSON_TYPES.get(param.annotation, "string")}
+        if param.name in param_docs:
+            prop["description"] = param_docs[param.name]
+        properties[param.name] = prop
+        if param.default is inspect.Parameter.empty:
+            required.append(param.name)
+
+    return {
+        "type": "function",
+        "function": {
+            "name": name,
+            "description": description,
+            "parameters": {"type": "object", "properties": properties, "required": required}
+        }
+    }
+
+
+def tool_schemas(actions: dict) -> list:
+    return [function_schema(name, func) for name, func in actions.items()]
@@ -0,0 +1,223 @@
+# Local Wikipedia search index for air-gapped deployments (SEARCH_BACKEND=local).
+#
+# Builds a SQLite FTS5 index from a Wikipedia abstracts dump and answers
+# web_search queries with BM25 ranking and the first sentences of each abstract,
+# like the live backend does.
+#
+#     python wiki_index.py build enwiki-latest-abstract.xml.gz      # resumable
+#     python wiki_index.py search "Google CEO"
+import os
+import re
+import bz2
+import sys
+import gzip
+import json
+import time
+import sqlite3
+import argparse
+import threading
+import xml.etree.ElementTree as ET
+
+INDEX_PATH = os.getenv("WIKI_INDEX_PATH", "wiki_index.db")
+MMAP_SIZE = int(os.getenv("WIKI_INDEX_MMAP", str(1 << 30)))   # Bytes of the index mapped into memory
+BATCH_SIZE = 5000                                              # Articles per ingest transaction
+TITLE_WEIGHT = 10.0                                            # BM25 weight of title vs abstract matches
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS articles (id INTEGER PRIMARY KEY, title TEXT UNIQUE NOT NULL, abstract TEXT NOT NULL);
+CREATE VIRTUAL TABLE IF NOT EXISTS articles_fts USING fts5(
+    title, abstract, content='articles', content_rowid='id', tokenize='porter unicode61'
+);
+CREATE TRIGGER IF NOT EXISTS articles_ai AFTER INSERT ON articles BEGIN
+    INSERT INTO articles_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_ad AFTER DELETE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract);
+END;
+CREATE TRIGGER IF NOT EXISTS articles_au AFTER UPDATE ON articles BEGIN
+    INSERT INTO articles_fts(articles_fts, rowid, title, abstract) VALUES ('delete', old.id, old.title, old.abstract);
+    INSERT INTO articles_fts(rowid, title, abstract) VALUES (new.id, new.title, new.abstract);
+END;
+CREATE TABLE IF NOT EXISTS ingest_progress (source TEXT PRIMARY KEY, documents INTEGER NOT NULL);
+"""
+
+# Abstracts that are really disambiguation or list stubs - the live backend skips those too
+SKIP_ABSTRACT = re.compile(r"\b(may|can|could) (also )?refer to\b|^\s*$", re.IGNORECASE)
+
+
+# --- Lead sentences ----------------------------------------------------------
+
+ABBREVIATIONS = {"e.g", "i.e", "etc", "vs", "mr", "mrs", "ms", "dr", "st", "jr", "sr", "no", "ca", "approx", "inc",
+                 "ltd", "co", "mt", "ft", "u.s", "u.k"}
+SENTENCE_END = re.compile(r"[.!?][\"')\]]*\s+(?=[\"'(\[]?[A-Z0-9])")
+
+
+def lead_sentences(text: str, count: int) -> str:
+    """The first `count` sentences of text, not splitting on abbreviations or initials."""
+    text = " ".join(text.split())
+    sentences = 0
+    for match in SENTENCE_END.finditer(text):
+        word = text[:match.start()].rsplit(" ", 1)[-1].lower().lstrip("(\"'")
+        if word in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+            continue
+        sentences += 1
+        if sentences >= count:
+            return text[:match.start() + 1]
+    return text
+
+
+# --- Ingest ------------------------------------------------------------------
+
+def _open(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rb")
+    if path.endswith(".bz2"):
+        return bz2.open(path, "rb")
+    return open(path, "rb")
+
+
+def read_dump(path: str):
+    """
+    Stream (title, abstract) pairs from an abstracts dump without loading it:
+    the enwiki-*-abstract.xml(.gz) format, or JSON lines of {"title", "abstract"}.
+    """
+    if path.endswith((".jsonl", ".jsonl.gz", ".jsonl.bz2")):
+        with _open(path) as f:
+            for line in f:
+                if line.strip():
+                    doc = json.loads(line)
+                    yield doc["title"], doc.get("abstract") or ""
+        return
+    with _open(path) as f:
+        root = None
+        for event, element in ET.iterparse(f, events=("start", "end")):
+            if root is None:
+                root = element
+            if event != "end" or element.tag != "doc":
+                continue
+            title = (element.findtext("title") or "").strip()
+            if title.startswith("Wikipedia: "):
+                title = title[len("Wikipedia: "):]
+            yield title, (element.findtext("abstract") or "").strip()
+            # Detach finished docs from <feed> too, so memory stays flat over a multi-GB dump
+            root.clear()
+
+
+def build(dump_path: str, index_path: str = None, restart: bool = False, log=print) -> int:
+    """
+    Add a dump to the index, committing every BATCH_SIZE articles. Progress is
+    stored per source file, so an interrupted build resumes where it stopped and
+    rerunning with a newer dump updates changed abstracts in place (`restart`
+    re-reads a file that was already indexed). Returns the number of articles written.
+    """
+    db = sqlite3.connect(index_path or INDEX_PATH)
+    db.executescript(SCHEMA)
+    db.execute("PRAGMA journal_mode=WAL")
+    db.execute("PRAGMA synchronous=OFF")  # A crash only loses the batch being written
+    # Releases reuse the file name (enwiki-latest-abstract.xml.gz), so a newer
+    # dump at the same path must not resume from the old one's progress
+    stat = os.stat(dump_path)
+    source = f"{os.path.abspath(dump_path)}|{stat.st_size}|{stat.st_mtime_ns}"
+    row = db.execute("SELECT documents FROM ingest_progress WHERE source = ?", (source,)).fetchone()
+    skip = row[0] if row and not restart else 0
+    if skip:
+        log(f"Resuming after {skip} documents")
+
+    written = seen = 0
+    batch = []
+    started = time.perf_counter()
+
+    def flush():
+        with db:
+            db.executemany(
+                "INSERT INTO articles (title, abstract) VALUES (?, ?) "
+                "ON CONFLICT(title) DO UPDATE SET abstract = excluded.abstract "
+                "WHERE abstract != excluded.abstract", batch)
+            db.execute("INSERT OR REPLACE INTO ingest_progress (source, documents) VALUES (?, ?)", (source, seen))
+        batch.clear()
+
+    for title, abstract in read_dump(dump_path):
+        seen += 1
+        if seen <= skip:
+            continue
+        if not title or SKIP_ABSTRACT.search(abstract):
+            continue
+        batch.append((title, abstract))
+        written += 1
+        if len(batch) >= BATCH_SIZE:
+            flush()
+            log(f"{seen} documents read, {written} written ({seen / (time.perf_counter() - started):.0f} docs/s)")
+    flush()
+    db.execute("INSERT INTO articles_fts(articles_fts) VALUES ('optimize')")  # Merge segments for fast reads
+    db.commit()
+    db.close()
+    return written
+
+
+# --- Search ------------------------------------------------------------------
+
+_local = threading.local()
+TOKEN = re.compile(r"\w+", re.UNICODE)
+
+
+def _connection(index_path: str) -> sqlite3.Connection:
+    # One read-only connection per thread; the OS page cache backs the mmap
+    connections = getattr(_local, "connections", None)
+    if connections is None:
+        connections = _local.connections = {}
+    db = connections.get(index_path)
+    if db is None:
+        if not os.path.exists(index_path):
+            raise FileNotFoundError(f"Local Wikipedia index not found at {index_path}")
+        db = sqlite3.connect(f"file:{index_path}?mode=ro", uri=True)
+        db.execute(f"PRAGMA mmap_size={MMAP_SIZE}")
+        connections[index_path] = db
+    return db
+
+
+def _match_query(query: str, operator: str) -> str:
+    # Quote every term so FTS5 syntax in user input (AND, NEAR, *, -) is taken literally
+    terms = ['"' + term.replace('"', '') + '"' for term in TOKEN.findall(query)]
+    return f" {operator} ".join(terms)
+
+
+def search(query: str, limit: int = 3, sentences: int = 2, index_path: str = None) -> list:
+    """Top `limit` articles for `query` as (title, lead sentences), best BM25 match first."""
+    db = _connection(index_path or INDEX_PATH)
+    rows = []
+    # All terms first; if that is too strict, any term (BM25 still favours pages matching more)
+    for operator in ("AND", "OR"):
+        match = _match_query(query, operator)
+        if not match:
+            return []
+        rows = db.execute(
+            "SELECT a.title, a.abstract FROM articles_fts JOIN articles a ON a.id = articles_fts.rowid "
+            "WHERE articles_fts MATCH ? ORDER BY bm25(articles_fts, ?, 1.0) LIMIT ?",
+            (match, TITLE_WEIGHT, limit)
+        ).fetchall()
+        if len(rows) >= limit:
+            break
+    return [(title, lead_sentences(abstract, sentences)) for title, abstract in rows]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Wikipedia index for web_search")
+    parser.add_argument("--index", default=INDEX_PATH, help="SQLite index file")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_cmd = commands.add_parser("build", help="Index an abstracts dump (.xml, .xml.gz, .jsonl)")
+    build_cmd.add_argument("dump")
+    build_cmd.add_argument("--restart", action="store_true", help="Re-read the dump from the start")
+    search_cmd = commands.add_parser("search", help="Query the index")
+    search_cmd.add_argument("query")
+    search_cmd.add_argument("--results", type=int, default=3)
+    search_cmd.add_argument("--sentences", type=int, default=2)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build(args.dump, args.index, args.restart, log=lambda message: print(message, file=sys.stderr))
+        print(f"Indexed {count} articles into {args.index}")
+    else:
+        start = time.perf_counter()
+        for title, summary in search(args.query, args.results, args.sentences, args.index):
+            print(f"Result ('{title}'):\n{summary}\n")
+        print(f"({1000 * (time.perf_counter() - start):.1f} ms)", file=sys.stderr)